@@ -5,18 +5,46 @@ class FollicleClass:
         self.Number = 1  # number of active foll
         self.Follicle = np.array([])  # number of created foll
         self.Active = np.array([1])  # number of currently active foll
+        self.ActiveIdx = self.Active - 1  # indexes of currently active foll in the arrays below
         self.NumActive = 1  # all foll structures
         self.ActiveFSHS = np.array([])  # all foll FSH sensitivities
 
+        # properties of all created foll, foll with number n is stored at index n-1
+        # the foll destinies: -1: not clear yet, 0:died, 1:ovulated, -2:decreasing in size but did not yet died
+        self.Destiny = np.array([-1], dtype=np.int8)
+        self.TimeStart = np.array([t], dtype=np.float64)  # time the foll was created
+        self.TimeLast = np.array([t], dtype=np.float64)  # last time the foll was integrated
+        self.TimeDecrease = np.array([0], dtype=np.float64)  # time the size of the foll started to decrease
+
         Foll = {
             'Number': 1,
             'Time': np.array([t]),
             'Y': np.array([y0Follicle]),
-            'Destiny': -1,  # the foll destinies: -1: not clear yet, 0:died, 1:ovulated, -2:decreasing in size but did not yet died
             'FSHSensitivity': FSHSensitivity,
-            'TimeDecrease': 0  # time the size of the foll started to decrease
         }
 
         self.Follicle = np.append(self.Follicle, Foll)
         self.ActiveFSHS = np.append(self.ActiveFSHS, Foll['FSHSensitivity'])
 
+    def AddFollicle(self, Foll):
+        """
+        Saves a new foll (dictionary with 'Time', 'Y' and 'FSHSensitivity') and sets it as active.
+        The destiny of the new foll is not clear yet (-1).
+        """
+        self.Number += 1
+        Foll['Number'] = self.Number
+        self.Follicle = np.append(self.Follicle, Foll)
+        self.Destiny = np.append(self.Destiny, np.array([-1], dtype=np.int8))
+        self.TimeStart = np.append(self.TimeStart, Foll['Time'][0])
+        self.TimeLast = np.append(self.TimeLast, Foll['Time'][-1])
+        self.TimeDecrease = np.append(self.TimeDecrease, 0.0)
+        self.SetActive(np.concatenate((self.Active, [Foll['Number']])), self.ActiveFSHS)
+
+    def SetActive(self, Active, ActiveFSHS):
+        """
+        Sets the numbers of currently active foll and their FSH sensitivities.
+        """
+        self.Active = np.asarray(Active, dtype=np.int64)
+        self.ActiveIdx = self.Active - 1
+        self.NumActive = len(self.Active)
+        self.ActiveFSHS = np.asarray(ActiveFSHS, dtype=np.float64)
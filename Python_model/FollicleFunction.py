@@ -1,90 +1,163 @@
 import numpy as np
+from numba import njit, prange
 
 from HormoneModel import ODE_Model_NormalCycle
 
+# destinies of follicles that are decreasing in size, dying or ovulating
+KILLED_DESTINIES = np.array([-2, -3, 4], dtype=np.int8)
+# Hill function thresholds raised to their (constant) Hill coefficients
+C095_5 = 0.95 ** 5
+C055_10 = 0.55 ** 10
+# from this number of active follicles on the follicles are integrated in parallel threads
+PARALLEL_MIN_FOLLICLES = 32
+
+
 def FollicleFunction(t, y, Tovu, Follicles, para, parafoll, Par, Stim, settings):
     # determine number of active follicles
     NumFollicles = y.shape[0] - para[1] # does not work when a new follicle is added
+    # when called to test (para[0] == 1) the follicles' destinies are neither used nor changed
+    live = para[0] == 0 and NumFollicles > 0
+
+    # extract the properties of the active follicles into plain arrays for the compiled kernels
+    if live:
+        active_idx = Follicles.ActiveIdx
+        destinies = Follicles.Destiny[active_idx]
+        time0 = Follicles.TimeStart[active_idx]
+        time_last = Follicles.TimeLast[active_idx]
+        time_decrease = Follicles.TimeDecrease[active_idx]
+        # such follicles do not produce E2 and do not compete
+        kill_mask = np.isin(destinies, KILLED_DESTINIES)
+        x = np.where(kill_mask, 0.0, y[:NumFollicles])
+    else:
+        x = np.array(y[:max(NumFollicles, 0)], dtype=np.float64)
+    active_fshs = Follicles.ActiveFSHS[:max(NumFollicles, 0)]
+
+    # calculate E2 and P4 concentration
+    E2_lvl, P4_lvl = _steroid_levels(t, x, Tovu, Par)
+
+    # solve differential equations
+    dy = ODE_Model_NormalCycle(t, y, Par, E2_lvl, P4_lvl) # E2 and p4 as  params
+    # dy is a new array on every call, the follicles' entries are overwritten in place
+    f = dy
 
-    if NumFollicles > 0:
-        x = y[:NumFollicles]
+    # the kernel is chosen once per call, so the compiled loops do not branch on para[0]
+    if live:
+        if NumFollicles >= PARALLEL_MIN_FOLLICLES:
+            core = _follicle_core_live_parallel
+        else:
+            core = _follicle_core_live
+        core(t, y, x, f, P4_lvl, destinies, time0, time_last, time_decrease, active_fshs,
+             parafoll, NumFollicles)
+        # write the destiny transitions back to the follicles
+        Follicles.Destiny[active_idx] = destinies
+        Follicles.TimeDecrease[active_idx] = time_decrease
     else:
-        x = np.array([0])
-
-    if NumFollicles > 0 and para[0] == 0:
-        #print("Follicles number", Follicles.Number)
-        #print("Supposedly num of follicles", NumFollicles)
-        #print(Follicles.Follicle)
-        for i in range(NumFollicles):
-            if Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] in [-2, -3]:
-                x[i] = 0
-
-    # E2 production
-    if NumFollicles > 0 and para[0] == 0:
-        for i in range(NumFollicles):
-            if Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == 4:
-                x[i] = 0
-
-    # calculate E2 concentration
-    SF = np.pi * np.sum((x ** Par[56]) / (x ** Par[56] + Par[57] ** Par[56]) * (x ** 2))
+        _follicle_core_test(y, x, f, P4_lvl, active_fshs, parafoll, NumFollicles)
+
+    return f
+
+
+@njit(cache=True, fastmath=True)
+def _steroid_levels(t, x, Tovu, Par):
+    n56 = Par[56]
+    c56 = Par[57] ** n56
+    SF = 0.0
+    for i in range(len(x)):
+        xk = x[i] ** n56
+        SF += xk * x[i] * x[i] / (xk + c56)
+    SF = np.pi * SF
     E2_lvl = Par[74] + (Par[58] + Par[59] * SF) + Par[60] * np.exp(-Par[61] * (t - (Tovu + 7)) ** 2)
     P4_lvl = Par[75] + Par[62] * np.exp(-Par[61] * (t - (Tovu + 7)) ** 2)
-    #print("E2:", E2_lvl, "P4:", P4_lvl)
-    #print("Folls +..., ", y)
-    #print("Num follicles:", NumFollicles, "Current P4 lvl: ", P4_lvl)
+    return E2_lvl, P4_lvl
 
-    # solve differential equations
-    dy = ODE_Model_NormalCycle(t, y, Par, E2_lvl, P4_lvl) # E2 and p4 as  params
-    f = dy.copy()
 
+@njit(cache=True, fastmath=True)
+def _growth_terms(y, x, P4_lvl, parafoll):
+    # terms of the follicles growth equation that are the same for all follicles
     r = len(y)
     fshrezcomp = y[r-15]
     p4all = P4_lvl
+
     SumV = np.sum(x ** parafoll[0])
 
+    # integer powers as multiplications
+    p4_3 = p4all / 3
+    p4_3 = p4_3 * p4_3 * p4_3
+    fshrezcomp2 = fshrezcomp * fshrezcomp
+    fshrezcomp4 = fshrezcomp2 * fshrezcomp2
+    fshrezcomp5 = fshrezcomp4 * fshrezcomp
+    fshrezcomp10 = fshrezcomp5 * fshrezcomp5
+
+    # growth rate
+    gamma = parafoll[1] * ((1 / (1 + p4_3)) + fshrezcomp5 / (C095_5 + fshrezcomp5))
+
+    # negative Hill function for FSH with kappa(proportion of self harm)
+    kappa = parafoll[4] * (C055_10 / (C055_10 + fshrezcomp10))
+
+    return SumV, gamma, kappa, fshrezcomp4
+
+
+@njit(cache=True, fastmath=True)
+def _follicle_core_test(y, x, f, P4_lvl, active_fshs, parafoll, NumFollicles):
+    # if called to test use normal equation
+    pf0, pf2, pf3 = parafoll[0], parafoll[2], parafoll[3]
+    SumV, gamma, kappa, fshrezcomp4 = _growth_terms(y, x, P4_lvl, parafoll)
+    xi = pf2
+
     for i in range(NumFollicles):
-        # FSH sensitivity of the follicles
-        fFSH = Follicles.ActiveFSHS[i]
         fsize = y[i]
+        fFSH2 = active_fshs[i] * active_fshs[i]
+        ffsh = fshrezcomp4 / (fshrezcomp4 + fFSH2 * fFSH2)
+        f[i] = ffsh * (xi - fsize) * fsize * (gamma - (kappa * (SumV - (pf3 * (fsize ** pf0)))))
+
+
+@njit(cache=True, fastmath=True)
+def _follicle_rate_live(i, t, y, f, destinies, time0, time_last, time_decrease, active_fshs, parafoll,
+                        SumV, gamma, kappa, fshrezcomp4):
+    # FSH sensitivity of the follicles
+    fFSH = active_fshs[i]
+    fsize = y[i]
+
+    fFSH2 = fFSH * fFSH
+    ffsh = fshrezcomp4 / (fshrezcomp4 + fFSH2 * fFSH2)
+
+    # follicles growth equation
+    X = ffsh * (parafoll[2] - fsize) * fsize * (gamma - (kappa * (SumV - (parafoll[3] * (fsize ** parafoll[0])))))
+
+    destiny = destinies[i]
+    if (X <= parafoll[11] or
+        destiny == -2 or
+        (X <= parafoll[12] and (t - time0[i]) >= parafoll[14] and destiny == 3) or
+        (X <= parafoll[12] and (t - time0[i]) >= parafoll[13] and destiny == -1) or
+        (destiny == 3 and (t - time_decrease[i]) >= parafoll[10]) or
+        (time0[i] - time_last[i] > parafoll[14])):
+        # set time the follicle starts to decrease & set destiny to decrease
+        if destiny != -2:
+            destinies[i] = -2
+            time_decrease[i] = t
+        # to decrease the size of the follicle faster
+        f[i] = -0.05 * y[i] * (t - time_decrease[i])
+    elif destiny == -3:
+        f[i] = -1000 * y[i]
+    else:
+        # if not dying use normal equation
+        f[i] = X
 
-        # growth rate
-        gamma = parafoll[1] * ((1 / (1 + (p4all / 3) ** 3)) + (fshrezcomp ** 5) / (0.95 ** 5 + fshrezcomp ** 5))
-
-        # negative Hill function for FSH with kappa(proportion of self harm)
-        kappa = parafoll[4] * (0.55 ** 10 / (0.55 ** 10 + fshrezcomp ** 10))
-
-        xi = parafoll[2]
-        ffsh = (fshrezcomp ** 4) / (fshrezcomp ** 4 + (fFSH) ** 4)
-
-        # follicles growth equation
-        X = ffsh * (xi - fsize) * fsize * (gamma - (kappa * (SumV - (parafoll[3] * (fsize ** parafoll[0])))))
-
-        if para[0] == 1:
-            if X <= 0:
-                NoFoll = X
-
-        if para[0] == 0:
-            if (X <= parafoll[11] or
-                Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == -2 or
-                (X <= parafoll[12] and (t - Follicles.Follicle[Follicles.Active[i]-1]['Time'][0]) >= parafoll[14] and Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == 3) or
-                (X <= parafoll[12] and (t - Follicles.Follicle[Follicles.Active[i]-1]['Time'][0]) >= parafoll[13] and Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == -1) or
-                (Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == 3 and (t - Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease']) >= parafoll[10]) or
-                (Follicles.Follicle[Follicles.Active[i]-1]['Time'][0] - Follicles.Follicle[Follicles.Active[i]-1]['Time'][-1] > parafoll[14])):
-                # set time the follicle starts to decrease & set destiny to decrease
-                #print(Follicles.Follicle)
-                #print(Follicles.Active)
-                if Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] != -2:
-                    Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] = -2
-                    Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease'] = t
-                # to decrease the size of the follicle faster
-                f[i] = -0.05 * y[i] * (t - Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease'])
-            elif Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == -3:
-                f[i] = -1000 * y[i]
-            else:
-                # if not dying use normal equation
-                f[i] = X
-        else:
-            # if called to test use normal equation
-            f[i] = X
 
-    return f
+@njit(cache=True, fastmath=True)
+def _follicle_core_live(t, y, x, f, P4_lvl, destinies, time0, time_last, time_decrease, active_fshs,
+                        parafoll, NumFollicles):
+    SumV, gamma, kappa, fshrezcomp4 = _growth_terms(y, x, P4_lvl, parafoll)
+    for i in range(NumFollicles):
+        _follicle_rate_live(i, t, y, f, destinies, time0, time_last, time_decrease, active_fshs, parafoll,
+                            SumV, gamma, kappa, fshrezcomp4)
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def _follicle_core_live_parallel(t, y, x, f, P4_lvl, destinies, time0, time_last, time_decrease, active_fshs,
+                                 parafoll, NumFollicles):
+    # every follicle only writes its own entries of f, destinies and time_decrease
+    SumV, gamma, kappa, fshrezcomp4 = _growth_terms(y, x, P4_lvl, parafoll)
+    for i in prange(NumFollicles):
+        _follicle_rate_live(i, t, y, f, destinies, time0, time_last, time_decrease, active_fshs, parafoll,
+                            SumV, gamma, kappa, fshrezcomp4)
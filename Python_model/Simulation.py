@@ -130,6 +130,7 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
             # saves all times of the foll that was active during last run
             Follicles.Follicle[Follicles.Active[i]-1]['Time'] = \
                     np.concatenate((Follicles.Follicle[Follicles.Active[i]-1]['Time'], T[1:]))
+            Follicles.TimeLast[Follicles.Active[i]-1] = Follicles.Follicle[Follicles.Active[i]-1]['Time'][-1]
             # saves all sizes of the foll that was active during last run
             Follicles.Follicle[Follicles.Active[i]-1]['Y'] = \
                     np.concatenate((Follicles.Follicle[Follicles.Active[i]-1]['Y'], Y[1:, i]))
@@ -144,16 +145,19 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
         # recalculate the x in every time step
         solution_time_points = T[1:]
         num_t = len(solution_time_points)
+        n56 = Par[56]
+        c56 = Par[57] ** n56
         for tidx in range(len(solution_time_points)):
             #x = y0[:NumFollicles]
             x = np.array([])
             for i in range(NumFollicles):
-                if NumFollicles > 0 and para[0] == 0 and Follicles.Follicle[Follicles.Active[i] - 1]['Destiny'] == 4:
+                if NumFollicles > 0 and para[0] == 0 and Follicles.Destiny[Follicles.Active[i] - 1] == 4:
                     x = np.append(x,0)
                 else:
                     x = np.append(x, Follicles.Follicle[Follicles.Active[i] - 1]['Y'][-num_t+tidx])
             t = solution_time_points[tidx]
-            SF = np.pi * np.sum((x ** Par[56]) / (x ** Par[56] + Par[57] ** Par[56]) * (x ** 2))
+            xk = x ** n56
+            SF = np.pi * np.sum(xk * x * x / (xk + c56))
             e2p4_lvls[0].append(Par[74] + (Par[58] + Par[59] * SF) + Par[60] * np.exp(-Par[61] * (t - (Tovu + 7)) ** 2))
         # save values for P4
         solution_time_points = T[1:]
@@ -210,14 +214,7 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
             # if follicle got chance to survive -> initiate new follicle and update follicles-vector
             if testyslope[-para[1]-1] > 0:
                 Follicle1['Time'] = np.array([T[-1]])
-                Follicle1['TimeDecrease'] = 0
-                Follicle1['Destiny'] = -1
-                Follicles.Number += 1
-                Follicle1['Number'] = Follicles.Number
-                Follicles.NumActive += 1
-                Follicles.Active = np.concatenate(
-                    (Follicles.Active, [Follicle1['Number']]))
-                Follicles.Follicle = np.append(Follicles.Follicle, Follicle1)
+                Follicles.AddFollicle(Follicle1)
                 NewFollicle.append(T[-1])
                 LastYValues = testyvalues
             else:
@@ -237,8 +234,8 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
         res = FollicleFunction(T[-1], LastYValues, Tovu, Follicles,
                                para, parafoll, Par, Stim,
                                settings)
-        # reset vector of active FSH sensitivities
-        Follicles.ActiveFSHS = []
+        # new vector of active FSH sensitivities
+        ActiveFSHSHelp = []
 
         # loop over all active follicles to set new destiny
         for i in range(Follicles.NumActive):
@@ -246,32 +243,32 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
             yCurFoll = LastYValues[i]
             # slope is negative so the follicle is decreasing in size
             if res[i] <= 0: 
-                Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] = -2
+                Follicles.Destiny[Follicles.Active[i]-1] = -2
             
             # follicle is big, but doesn't ovulate yet because there is not enough LH
             if (yCurFoll >= parafoll[6]) and (Y[-1, -9] < parafoll[9] and
-               Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == -1):
-                Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] = 3
-                Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease'] = t
+               Follicles.Destiny[Follicles.Active[i]-1] == -1):
+                Follicles.Destiny[Follicles.Active[i]-1] = 3
+                Follicles.TimeDecrease[Follicles.Active[i]-1] = t
 
-            if (Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == 3 and 
-               (t - Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease']) >= parafoll[10]):
-                Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] = -2
+            if (Follicles.Destiny[Follicles.Active[i]-1] == 3 and 
+               (t - Follicles.TimeDecrease[Follicles.Active[i]-1]) >= parafoll[10]):
+                Follicles.Destiny[Follicles.Active[i]-1] = -2
             
             # if LH high enough dominant follicle rest until ovulation shortly after LH peak 
             if Y[-1, -9] >= parafoll[9]:
-                if (yCurFoll >= parafoll[6] and Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == -1) or \
-                   (yCurFoll >= parafoll[6] and Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == 3):
+                if (yCurFoll >= parafoll[6] and Follicles.Destiny[Follicles.Active[i]-1] == -1) or \
+                   (yCurFoll >= parafoll[6] and Follicles.Destiny[Follicles.Active[i]-1] == 3):
                     th = t - 0.5
                     idx = np.argmin(np.abs(LH['Time'] - th))
                     if LH['Y'][idx] >= parafoll[9]:
-                        Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] = 4
-                        Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease'] = t
+                        Follicles.Destiny[Follicles.Active[i]-1] = 4
+                        Follicles.TimeDecrease[Follicles.Active[i]-1] = t
             
             # Follicle ovulates
-            if (Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] == 4 and 
-                Follicles.Follicle[Follicles.Active[i]-1]['TimeDecrease'] <= t):
-                Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] = 1
+            if (Follicles.Destiny[Follicles.Active[i]-1] == 4 and 
+                Follicles.TimeDecrease[Follicles.Active[i]-1] <= t):
+                Follicles.Destiny[Follicles.Active[i]-1] = 1
                 Tovu = T[-1]
                 OvulationNumber = i
                 if Stim:
@@ -281,19 +278,17 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
             # Follicles that ovulated are no longer active
             # Follicles that are dead and has been active for more than 20 days are also not considered
             #   active to optimize the simulation
-            if Follicles.Follicle[Follicles.Active[i]-1]['Destiny'] != 1 and \
-                    (Follicles.Follicle[Follicles.Active[i]-1]['Time'][0] + 20 > t or
+            if Follicles.Destiny[Follicles.Active[i]-1] != 1 and \
+                    (Follicles.TimeStart[Follicles.Active[i]-1] + 20 > t or
                      Follicles.Follicle[Follicles.Active[i]-1]['Y'][-1] != 0):
                 # put the follicle back to the list of actives and its FSH
                 ActiveHelp.append(Follicles.Active[i])
                 # sensitivity back in the FSH vector...
-                Follicles.ActiveFSHS.append(Follicles.Follicle[Follicles.Active[i]-1]['FSHSensitivity'])
+                ActiveFSHSHelp.append(Follicles.Follicle[Follicles.Active[i]-1]['FSHSensitivity'])
 
 
-        # Update list of active follicles
-        Follicles.Active = ActiveHelp
-        # find out how many follicles are active...
-        Follicles.NumActive = len(ActiveHelp)
+        # Update list of active follicles and find out how many follicles are active...
+        Follicles.SetActive(ActiveHelp, ActiveFSHSHelp)
         # determine new initial values for all differential equations
         y0old = []
         for i in range(Follicles.NumActive):
@@ -321,14 +316,14 @@ def Simulation(para, paraPoi, parafoll, Par, tb, te,
         # fill follicle information variable...
         help_info = [Follicles.Follicle[i]['Time'][0],
                      Follicles.Follicle[i]['Time'][-1],
-                     Follicles.Follicle[i]['Destiny'],
+                     Follicles.Destiny[i],
                      Follicles.Follicle[i]['FSHSensitivity'], i]
         FollInfo.append(help_info)
 
         FollInfo2 = np.column_stack((Follicles.Follicle[i]['Time'],
                                      Follicles.Follicle[i]['Y']))
 
-        if Follicles.Follicle[i]['Destiny'] == 1 and Follicles.Follicle[i]['Time'][0] > 20:
+        if Follicles.Destiny[i] == 1 and Follicles.Follicle[i]['Time'][0] > 20:
             helpFOT = [i, Follicles.Follicle[i]['Time'][0],
                        Follicles.Follicle[i]['Time'][-1],
                        (Follicles.Follicle[i]['Y'][-1] - Follicles.Follicle[i]['Y'][0]) /
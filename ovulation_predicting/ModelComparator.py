@@ -1,4 +1,5 @@
 import itertools
+from collections import defaultdict
 
 import matplotlib as mpl
 import matplotlib.pyplot as plt
@@ -11,7 +12,7 @@ import supporting_scripts as sp
 
 class ModelComparator:
     def __init__(self, test_df, input_length, pred_length, features, hormone,
-                 step=5, plot=True, peak_comparison_distance=2):
+                 step=5, plot=True, peak_comparison_distance=2, plot_dir=None):
         """
         This class server as a basis for comparison of different models for LH peak prediction.
 
@@ -23,6 +24,7 @@ class ModelComparator:
         :param step: difference between beginning of every consecutive input for comparison. For the best comparison step=1 is advised
         :param plot: if true, plot the individual input-prediction windows. If step is 1 may result in large amount of plots.
         :param peak_comparison_distance: threshold for comparing the peak prediction accuracy. Maximum distance of every predicted peak from the nearest gt peak to be considered truly predicted
+        :param plot_dir: if specified, the plots are saved to this directory instead of being shown
         """
         self.test_df = test_df
         self.input_length = input_length
@@ -35,6 +37,7 @@ class ModelComparator:
         self.step = step
         self.plot = plot
         self.peak_comparison_distance = peak_comparison_distance
+        self.plot_dir = plot_dir
 
         self.MIN_PEAK_DISTANCE = 20
         self.MIN_PEAK_HEIGHT = 0.3
@@ -56,8 +59,7 @@ class ModelComparator:
         These peaks are then compared to the ground-truth peaks identified in the test_df.
         ModelComparator tests for every predicted peak if it is within the threshold of the nearest gt peak
         and for every gt peak in the output window if it is with the same threshold of the nearest predicted peak.
-        If plotting is enabled, the for every window also plots the models' outputs with detected peaks. Yellow predicted
-        peaks are those within the threshold of the nearest gt peak.
+        If plotting is enabled, the windows are plotted by plot_windows after all of them were compared.
         :param list_of_models: list of models to compare
         :param run_id: id of a run
         :return: None
@@ -79,12 +81,13 @@ class ModelComparator:
         peaks, _ = scipy.signal.find_peaks(
             self.test_df[hormone], distance=self.MIN_PEAK_DISTANCE / 2, height=self.MIN_PEAK_HEIGHT)
         if self.plot:
-            plt.plot(test_df.index, test_df[self.features])
-            plt.scatter(test_df.index[peaks], test_df[hormone].iloc[peaks],
-                        color='red', zorder=5, label='Highlighted Points')
-            plt.xlabel('Time [hours]')
-            plt.title('Test {} data'.format(self.features))
-            plt.show()
+            fig, ax = plt.subplots()
+            ax.plot(test_df.index, test_df[self.features])
+            ax.scatter(test_df.index[peaks], test_df[hormone].iloc[peaks],
+                       color='red', zorder=5, label='Highlighted Points')
+            ax.set_xlabel('Time [hours]')
+            ax.set_title('Test {} data'.format(self.features))
+            self.show_figure(fig, 'test_data_{}'.format(run_id))
         """
         Move along the testing TS. For every window of input_length + pred_length:
             extract the input data
@@ -92,123 +95,138 @@ class ModelComparator:
             extract peaks in the current window (input and output)
             shift peaks by the offset of the current window
         """
-        dict_of_model_predictions = {model._name: [] for model in list_of_models}
-        batch_size = 32
-        i = 0
         limit = self.duration - pred_length - input_length + 1
-        while i < limit:
-            current_batch_size = min(batch_size, limit - i)
-            batch_data = [test_df.iloc[i + j:i + j + self.input_length][self.features].values for j in
-                      range(current_batch_size)]
-            tensor_batch = tf.convert_to_tensor(batch_data, dtype=tf.float32)
-            reshaped_tensor_batch = tf.reshape(tensor_batch, (current_batch_size, self.input_length, self.num_features))
-            batch_predictions_dict = {model._name: None for model in list_of_models}
-            for model in list_of_models:
-                new_tensor = reshaped_tensor_batch[:, :, :model.num_features]
-                batch_predictions = model(new_tensor)
-                batch_predictions = tf.reshape(batch_predictions, (current_batch_size, self.pred_length, model.num_output_features))
-                batch_predictions_dict[model._name] = batch_predictions
-                for j in range(current_batch_size):
-                    predictions = batch_predictions_dict[model._name][j][:, self.hoi_index]
-                    dict_of_model_predictions[model._name].append(predictions)
-            i += current_batch_size
+        # All the input windows in one batch, every model is called only once
+        test_data = test_df[self.features].to_numpy(dtype=np.float32)
+        # Windows of shape (limit, input_length, num_features) as a view of test_data
+        batch_data = np.lib.stride_tricks.sliding_window_view(test_data, self.input_length, axis=0)[:limit]
+        reshaped_tensor_batch = tf.convert_to_tensor(batch_data.transpose(0, 2, 1))
+        dict_of_model_predictions = dict()
+        for model in list_of_models:
+            new_tensor = reshaped_tensor_batch[:, :, :model.num_features]
+            batch_predictions = model(new_tensor)
+            batch_predictions = tf.reshape(batch_predictions, (limit, self.pred_length, model.num_output_features))
+            dict_of_model_predictions[model._name] = batch_predictions[:, :, self.hoi_index].numpy()
 
-        for offset in range(0, self.duration - pred_length - input_length + 1 - reverse_offset, self.step):
-            # For every model extract the prediction for this time window
-            list_of_model_predictions = []
-            for model in list_of_models:
-                list_of_model_predictions.append(dict_of_model_predictions[model._name][offset])
-            # Ground-truth time in days shifted to start with 0
-            gt_time = test_df.index[offset:input_length + pred_length + offset]
-            gt_time = gt_time / 24
-            first_elem = gt_time[0]
-            gt_time = gt_time - first_elem
-            # Prediction time in days shifted to start with input_length-th day
-            pred_time = test_df.index[input_length + offset:input_length + pred_length + offset]
-            pred_time = pred_time / 24
-            pred_time = pred_time - first_elem
-            # Ground truth values for the whole window
-            ground_truth = test_df[hormone][offset:input_length + pred_length + offset]
+        offsets = np.arange(0, self.duration - pred_length - input_length + 1 - reverse_offset, self.step)
+        # Peaks are sorted, the peaks of every window are a slice of them between these indices
+        window_starts = np.searchsorted(peaks, offsets)
+        pred_window_starts = np.searchsorted(peaks, offsets + input_length)
+        window_ends = np.searchsorted(peaks, offsets + input_length + pred_length)
+        first_method_ends = np.searchsorted(peaks, offsets + input_length + pred_length + reverse_offset)
+        # Histograms of the signed peak distances, distances are bounded by the window including the reverse_offset
+        max_distance = input_length + pred_length + reverse_offset
+        hists = {model._name: np.zeros(2 * max_distance + 1, dtype=np.int64) for model in list_of_models}
+        hists_rev = {model._name: np.zeros(2 * max_distance + 1, dtype=np.int64) for model in list_of_models}
+        # Peaks of the windows to plot after the comparison
+        windows_to_plot = []
+        model_names = [model._name for model in list_of_models]
+        #methods = ['dense', 'combined', 'raw', 'smooth']
+        methods = ['raw'] * len(list_of_models)
+        # Detect peaks in the predictions of all the windows at once
+        dict_of_model_peaks = dict()
+        for model, model_name, method in zip(list_of_models, model_names, methods):
+            window_predictions = dict_of_model_predictions[model_name][offsets]
+            if hasattr(model, 'get_peaks_batch'):
+                dict_of_model_peaks[model_name] = model.get_peaks_batch(window_predictions, method)
+            else:
+                dict_of_model_peaks[model_name] = [model.get_peaks(prediction, method)
+                                                   for prediction in window_predictions]
+        for k, offset in enumerate(offsets):
             # Take only the peaks in the prediction window (input and output window)
             # Shift them so that their time aligns with the offset data
-            curr_peaks = np.array([x for x in peaks if offset <= x < input_length + pred_length + offset])
-            curr_peaks = curr_peaks - offset
-            peaks_for_first_method = np.array([x for x in peaks if offset <= x < input_length + pred_length + offset + reverse_offset])
-            peaks_for_first_method = peaks_for_first_method - offset
-            gt_peaks_predWindow = np.array([x for x in peaks if offset + input_length <= x < input_length + pred_length + offset])
-            gt_peaks_predWindow = gt_peaks_predWindow - offset
+            curr_peaks = peaks[window_starts[k]:window_ends[k]] - offset
+            peaks_for_first_method = peaks[window_starts[k]:first_method_ends[k]] - offset
+            gt_peaks_predWindow = peaks[pred_window_starts[k]:window_ends[k]] - offset
             #if len(gt_peaks_predWindow) >= 1:
             #    gt_peaks_predWindow = gt_peaks_predWindow[:1]
-            # Try all the peaks, shift them to match the predicted data
-            all_peaks_offset = np.array([x for x in peaks]) - offset
-            if self.plot:
-                plt.plot(gt_time, ground_truth, marker='.', )
-            # Plot the tips of the peaks that are in the input-prediction window (input and output window)
-            if len(curr_peaks) > 0 and self.plot:
-                plt.scatter(gt_time[curr_peaks], ground_truth.iloc[curr_peaks],
-                            color='red', zorder=5, label='Test data peaks')
-            #methods = ['dense', 'combined', 'raw', 'smooth']
-            methods = ['raw' for _ in range(len(list_of_models))]
-            for i in range(len(list_of_model_predictions)):
-                model = list_of_models[i]
-                model_name = model._name
-                model_predictions = list_of_model_predictions[i]
-                # Detect peaks in the prediction part (forecast) and shift them to start from the right time
-                pred_peaks = model.get_peaks(model_predictions, methods[i])
+            window_model_peaks = []
+            for model_name in model_names:
+                # Peaks in the prediction part (forecast) of this window, shift them to start from the right time
+                pred_peaks = dict_of_model_peaks[model_name][k]
                 #pred_peaks, _ = scipy.signal.find_peaks(model_predictions, distance=self.MIN_PEAK_DISTANCE)
-                results.num_detected_peaks[model_name] = results.num_detected_peaks.get(model_name, 0) + len(pred_peaks)
+                results.num_detected_peaks[model_name] += len(pred_peaks)
                 offset_pred_peaks = pred_peaks + input_length
                 unfiltered_signed_distances = sp.get_signed_distances(peaks_for_first_method, offset_pred_peaks)
                 unfiltered_signed_distances_rev = sp.get_signed_distances(offset_pred_peaks, gt_peaks_predWindow[:1])
-                unfiltered_abs_distances = np.array([abs(dist) for dist in unfiltered_signed_distances])
-                unfiltered_abs_distances_rev = np.array([abs(dist) for dist in unfiltered_signed_distances_rev])
                 # Proceed only if there are any ground-truth peaks in the output part
                 if len(curr_peaks) > 0:
-                    filtered_distances = np.array(
-                        [distance for distance in unfiltered_abs_distances if distance <= self.peak_comparison_distance])
-                    results.peaks_within_threshold[model_name] = (
-                            results.peaks_within_threshold.get(model_name, 0) + len(filtered_distances))
-                    results.peaks_outside_threshold[model_name] = (
-                            results.peaks_outside_threshold.get(model_name, 0) + len(pred_peaks) - len(filtered_distances))
-                    results.sum_of_dists_to_nearest_peak[model_name] = (
-                            results.sum_of_dists_to_nearest_peak.get(model_name, 0) + sum(unfiltered_abs_distances))
-                    filtered_distances_rev = np.array(
-                        [distance for distance in unfiltered_abs_distances_rev if distance <= self.peak_comparison_distance])
-                    results.peaks_within_threshold_rev[model_name] = (
-                        results.peaks_within_threshold_rev.get(model_name, 0) + len(filtered_distances_rev))
-                    results.peaks_outside_threshold_rev[model_name] = (
-                        results.peaks_outside_threshold_rev.get(model_name, 0)
-                        + len(gt_peaks_predWindow) - len(filtered_distances_rev))
-                    pdd = results.peak_distances_distribution.get(model_name, dict())
-                    pddR = results.peak_distances_distribution_rev.get(model_name, dict())
-                    for distance in unfiltered_signed_distances:
-                        pdd[distance] = pdd.get(distance, 0) + 1
-                    for distance in unfiltered_signed_distances_rev:
-                        pddR[distance] = pddR.get(distance, 0) + 1
-                    results.peak_distances_distribution[model_name] = pdd
-                    results.peak_distances_distribution_rev[model_name] = pddR
+                    # All the counts of both directions in one pass over the distances
+                    num_within, sum_of_dists, num_within_rev = sp.accumulate_window_distances(
+                        unfiltered_signed_distances.astype(np.int64, copy=False),
+                        unfiltered_signed_distances_rev.astype(np.int64, copy=False),
+                        hists[model_name], hists_rev[model_name], max_distance, self.peak_comparison_distance)
+                    results.peaks_within_threshold[model_name] += num_within
+                    results.peaks_outside_threshold[model_name] += len(pred_peaks) - num_within
+                    results.sum_of_dists_to_nearest_peak[model_name] += sum_of_dists
+                    results.peaks_within_threshold_rev[model_name] += num_within_rev
+                    results.peaks_outside_threshold_rev[model_name] += len(gt_peaks_predWindow) - num_within_rev
                 if self.plot:
-                    line, = plt.plot(pred_time, model_predictions, marker='.', label=model_name)
-                    line_color = line.get_color()
-                    darker_line_color = sp.darken_color(line_color, 0.5)
-                    if len(unfiltered_abs_distances) != 0:
-                        for j in range(len(pred_peaks)):
-                            if unfiltered_abs_distances[j] <= self.peak_comparison_distance:
-                                plt.scatter(pred_time[pred_peaks[j]], model_predictions[pred_peaks[j]],
-                                            color='yellow', zorder=5)
-                            else:
-                                plt.scatter(pred_time[pred_peaks[j]], model_predictions[pred_peaks[j]],
-                                            color=darker_line_color, zorder=5)
-                    else:
-                        if len(pred_peaks) != 0:
-                            plt.scatter(pred_time[pred_peaks], model_predictions[pred_peaks],
-                                        color=darker_line_color, zorder=5)
+                    window_model_peaks.append((model_name, pred_peaks, unfiltered_signed_distances))
             if self.plot:
-                plt.axvline(x=input_length, color='r', linestyle='--', )
-                plt.legend(loc='upper left')
-                plt.title('Prediction on {} days with offset {} days'.format(input_length, offset))
-                plt.show()
+                windows_to_plot.append((offset, curr_peaks, window_model_peaks))
+        results.distance_bins = np.arange(-max_distance, max_distance + 1)
+        for model_name in results.num_detected_peaks.keys():
+            # Only the models that were compared on a window with gt peaks
+            if model_name in results.peaks_within_threshold:
+                results.peak_distances_distribution[model_name] = hists[model_name]
+                results.peak_distances_distribution_rev[model_name] = hists_rev[model_name]
         self.results[run_id] = results
+        if self.plot:
+            self.plot_windows(windows_to_plot, dict_of_model_predictions, run_id)
+
+    def plot_windows(self, windows, dict_of_model_predictions, run_id):
+        """
+        Plots the input-prediction windows compared by compare_models with the models' outputs and detected peaks.
+        Yellow predicted peaks are those within the threshold of the nearest gt peak.
+        :param windows: list of tuples (offset, gt peaks in the window, list of tuples (model name, predicted peaks,
+        signed distances of the predicted peaks to the nearest gt peak))
+        :param dict_of_model_predictions: dictionary of models' names and their predictions for every offset
+        :param run_id: id of a run
+        :return: None
+        """
+        test_df = self.test_df
+        input_length = self.input_length
+        pred_length = self.pred_length
+        time_days = test_df.index.to_numpy(dtype=np.float64) / 24
+        hormone_values = test_df[self.hormone].to_numpy()
+        for offset, curr_peaks, window_model_peaks in windows:
+            # Ground-truth time in days shifted to start with 0
+            gt_time = time_days[offset:input_length + pred_length + offset] - time_days[offset]
+            # Prediction time in days shifted to start with input_length-th day
+            pred_time = gt_time[input_length:]
+            # Ground truth values for the whole window
+            ground_truth = hormone_values[offset:input_length + pred_length + offset]
+            fig, ax = plt.subplots()
+            ax.plot(gt_time, ground_truth, marker='.', )
+            # Plot the tips of the peaks that are in the input-prediction window (input and output window)
+            if len(curr_peaks) > 0:
+                ax.scatter(gt_time[curr_peaks], ground_truth[curr_peaks],
+                           color='red', zorder=5, label='Test data peaks')
+            for model_name, pred_peaks, signed_distances in window_model_peaks:
+                model_predictions = dict_of_model_predictions[model_name][offset]
+                line, = ax.plot(pred_time, model_predictions, marker='.', label=model_name)
+                darker_line_color = sp.darken_color(line.get_color(), 0.5)
+                if len(signed_distances) != 0:
+                    within = np.abs(signed_distances) <= self.peak_comparison_distance
+                    colors = ['yellow' if is_within else darker_line_color for is_within in within]
+                    ax.scatter(pred_time[pred_peaks], model_predictions[pred_peaks], color=colors, zorder=5)
+                elif len(pred_peaks) != 0:
+                    ax.scatter(pred_time[pred_peaks], model_predictions[pred_peaks],
+                               color=darker_line_color, zorder=5)
+            ax.axvline(x=input_length, color='r', linestyle='--', )
+            ax.legend(loc='upper left')
+            ax.set_title('Prediction on {} days with offset {} days'.format(input_length, offset))
+            self.show_figure(fig, 'window_{}_{}'.format(run_id, offset))
+
+    def show_figure(self, fig, name):
+        """
+        Shows the figure, or saves it to the plot_dir and closes it if the plot_dir is specified.
+        :param fig: figure to show
+        :param name: name of the file the figure is saved to
+        :return: None
+        """
+        sp.show_figure(fig, name, self.plot_dir)
 
     def get_run_results(self, run_id):
         """
@@ -258,33 +276,29 @@ class ModelComparator:
                 return  # ADD COLOURS BASED ON THE DISTANCE
             peak_distances_distribution = results.peak_distances_distribution
             peak_distances_distribution_rev = results.peak_distances_distribution_rev
-            max_val = max(max(max(inner_dict.values()) for inner_dict in peak_distances_distribution.values()),
-                          max(max(inner_dict.values()) for inner_dict in peak_distances_distribution_rev.values())) + 1
+            max_val = max(max(hist.max() for hist in peak_distances_distribution.values()),
+                          max(hist.max() for hist in peak_distances_distribution_rev.values())) + 1
+            keys = results.distance_bins
+            colors = np.where(np.abs(keys) <= self.peak_comparison_distance, 'yellow', '#1f77b4')
             for model_name in peak_distances_distribution.keys():
                 if mode[0]:
                     pdd = peak_distances_distribution[model_name]
-                    keys = list(pdd.keys())
-                    values = list(pdd.values())
-                    colors = ['yellow' if abs(key) <= self.peak_comparison_distance else '#1f77b4' for key in keys]
-                    plt.bar(keys, values, color=colors)
+                    plt.bar(keys, pdd, color=colors)
                     plt.xlim(-35, 35)
                     plt.ylim(0, max_val)
                     plt.xlabel('Signed distance of forecasted peaks to the nearest ground truth peak')
                     plt.ylabel('Number of peaks')
                     plt.title('Model name: ' + model_name + " (run ID: {})".format(run_id))
-                    plt.show()
+                    self.show_figure(plt.gcf(), 'distribution_{}_{}'.format(model_name, run_id))
                 if mode[1]:
                     pddr = peak_distances_distribution_rev[model_name]
-                    keys = list(pddr.keys())
-                    values = list(pddr.values())
-                    colors = ['yellow' if abs(key) <= self.peak_comparison_distance else '#1f77b4' for key in keys]
-                    plt.bar(keys, values, color=colors)
+                    plt.bar(keys, pddr, color=colors)
                     plt.xlim(-35, 35)
                     plt.ylim(0, max_val)
                     plt.xlabel('Signed distance of ground truth peaks to the nearest forecasted peak')
                     plt.ylabel('Number of peaks')
                     plt.title('Model name: ' + model_name + " (run ID: {})".format(run_id))
-                    plt.show()
+                    self.show_figure(plt.gcf(), 'distribution_rev_{}_{}'.format(model_name, run_id))
 
     def simulation_summary(self):
         """
@@ -294,37 +308,28 @@ class ModelComparator:
         sum_of_dists_to_nearest_peak, num_detected_peaks.
         :return: None
         """
-        self.peaks_within_threshold = {}
-        self.peaks_outside_threshold = {}
-        self.peaks_within_threshold_rev = {}
-        self.peaks_outside_threshold_rev = {}
-        self.sum_of_dists_to_nearest_peak = {}
-        self.num_detected_peaks = {}
+        self.peaks_within_threshold = defaultdict(list)
+        self.peaks_outside_threshold = defaultdict(list)
+        self.peaks_within_threshold_rev = defaultdict(list)
+        self.peaks_outside_threshold_rev = defaultdict(list)
+        self.sum_of_dists_to_nearest_peak = defaultdict(list)
+        self.num_detected_peaks = defaultdict(list)
         for run_id in self.results.keys():
             within, outside, nearest_dists, num_detected, peak_distances_distribution, within_rev, outside_rev = (
                 self.get_run_results_tuple(run_id))
 
             for model_name, num_peaks_within in within.items():
-                self.peaks_within_threshold[model_name] = (
-                        self.peaks_within_threshold.get(model_name, list()) + [num_peaks_within])
+                self.peaks_within_threshold[model_name].append(num_peaks_within)
             for model_name, num_peaks_outside in outside.items():
-                self.peaks_outside_threshold[model_name] = (
-                        self.peaks_outside_threshold.get(model_name, list()) + [
-                    num_peaks_outside])
+                self.peaks_outside_threshold[model_name].append(num_peaks_outside)
             for model_name, nearest_peak_dist in nearest_dists.items():
-                self.sum_of_dists_to_nearest_peak[model_name] = (
-                        self.sum_of_dists_to_nearest_peak.get(model_name, list()) + [
-                    nearest_peak_dist])
+                self.sum_of_dists_to_nearest_peak[model_name].append(nearest_peak_dist)
             for model_name, num_detected_peak in num_detected.items():
-                self.num_detected_peaks[model_name] = (
-                        self.num_detected_peaks.get(model_name, list()) + [num_detected_peak])
+                self.num_detected_peaks[model_name].append(num_detected_peak)
             for model_name, num_peaks_within_rev in within_rev.items():
-                self.peaks_within_threshold_rev[model_name] = (
-                        self.peaks_within_threshold_rev.get(model_name, list()) + [num_peaks_within_rev])
+                self.peaks_within_threshold_rev[model_name].append(num_peaks_within_rev)
             for model_name, num_peaks_outside_rev in outside_rev.items():
-                self.peaks_outside_threshold_rev[model_name] = (
-                        self.peaks_outside_threshold_rev.get(model_name, list()) + [
-                    num_peaks_outside_rev])
+                self.peaks_outside_threshold_rev[model_name].append(num_peaks_outside_rev)
 
     def plot_in_out_peaks(self, mode=(True,True)):
         """
@@ -373,7 +378,7 @@ class ModelComparator:
             plt.ylabel('How well are the peaks hit')
             plt.title('')
             plt.legend(title="Model")
-            plt.show()
+            self.show_figure(plt.gcf(), 'in_out_peaks_rates')
         if mode[0]:
             plt.figure(figsize=(8, 6))
             for idx, key in enumerate(self.peaks_within_threshold):
@@ -392,7 +397,7 @@ class ModelComparator:
             plt.title('How well are the prediction peaks placed near the nearest gt peak '
                       '\n(how well placed are the peaks from the prediction)')
             plt.legend(title="Model")
-            plt.show()
+            self.show_figure(plt.gcf(), 'in_out_peaks')
         if mode[1]:
             plt.figure(figsize=(8, 6))
             for idx, key in enumerate(self.peaks_within_threshold_rev):
@@ -412,7 +417,7 @@ class ModelComparator:
             plt.title('How well are the gt peaks predicted by the nearest prediction peak '
                       '\n(how well are the gt peaks identified by the nearest peak from the prediction)')
             plt.legend(title="Model")
-            plt.show()
+            self.show_figure(plt.gcf(), 'in_out_peaks_rev')
 
     def print_peak_statistics(self):
         """
@@ -429,11 +434,14 @@ class ModelComparator:
 
 class ComparisonResults:
     def __init__(self):
-        self.peaks_within_threshold = {}
-        self.peaks_outside_threshold = {}
-        self.peaks_within_threshold_rev = {}
-        self.peaks_outside_threshold_rev = {}
-        self.sum_of_dists_to_nearest_peak = {}
-        self.num_detected_peaks = {}
+        # counters of models' names, missing models start at 0
+        self.peaks_within_threshold = defaultdict(int)
+        self.peaks_outside_threshold = defaultdict(int)
+        self.peaks_within_threshold_rev = defaultdict(int)
+        self.peaks_outside_threshold_rev = defaultdict(int)
+        self.sum_of_dists_to_nearest_peak = defaultdict(int)
+        self.num_detected_peaks = defaultdict(int)
+        # histograms of models' names, counts of the signed peak distances in distance_bins
         self.peak_distances_distribution = {}
         self.peak_distances_distribution_rev = {}
+        self.distance_bins = None
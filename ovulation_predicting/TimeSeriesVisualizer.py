@@ -72,18 +72,16 @@ class TimeSeriesVisualizer:
         if len(self.hormones) == 0:
             print("No hormones defined")
             return
+        # one contiguous copy of the hormones, the input windows are its slices
+        hormone_values = self.df[self.hormones].to_numpy(dtype=np.float32)
         if list_of_models is not None:
             window_data = self.df.iloc[:self.window_size]
             window_data.index = (window_data.index - window_data.index[0]) / 24
-            input_data = []
-            for hormone in self.hormones:
-                feature_inputs = window_data[hormone].iloc[:self.INPUT_LENGTH]
-                input_data.append(feature_inputs)
-            tensor = tf.convert_to_tensor(input_data, dtype=tf.float32)
-            reshaped_tensor = tf.reshape(tensor, (1, self.INPUT_LENGTH, self.num_features))
+            # (1, INPUT_LENGTH, num_features)
+            reshaped_tensor = tf.convert_to_tensor(hormone_values[np.newaxis, :self.INPUT_LENGTH])
             for model in list_of_models:
                 new_tensor = reshaped_tensor[:, :, :model.num_features]
-                model_predictions = model(new_tensor)
+                model_predictions = getattr(model, 'predict_cached', model)(new_tensor)
                 predictions = tf.reshape(model_predictions, (1, self.OUTPUT_LENGTH, model.num_output_features))
                 predictions = predictions[0][:, self.hoi_index]
                 x = window_data.index[self.INPUT_LENGTH:]
@@ -121,14 +119,15 @@ class TimeSeriesVisualizer:
         while i < limit:
             current_batch_size = min(self.batch_size, limit - i)
             if list_of_models is not None:
-                batch_data = [self.df.iloc[i + j:i + j + self.INPUT_LENGTH][self.hormones].values for j in
-                              range(current_batch_size)]
-                tensor_batch = tf.convert_to_tensor(batch_data, dtype=tf.float32)
-                reshaped_tensor_batch = tf.reshape(tensor_batch, (current_batch_size, self.INPUT_LENGTH, self.num_features))
+                # (current_batch_size, INPUT_LENGTH, num_features)
+                batch_data = np.stack([hormone_values[i + j:i + j + self.INPUT_LENGTH] for j in
+                                       range(current_batch_size)])
+                reshaped_tensor_batch = tf.convert_to_tensor(batch_data)
                 batch_predictions_dict = {model._name: None for model in list_of_models}
                 for model in list_of_models:
                     new_tensor = reshaped_tensor_batch[:, :, :model.num_features]
-                    batch_predictions = model(new_tensor)
+                    # the first and the last batch have different sizes, cached prediction avoids the retracing
+                    batch_predictions = getattr(model, 'predict_cached', model)(new_tensor)
                     batch_predictions = tf.reshape(batch_predictions, (current_batch_size, self.OUTPUT_LENGTH, model.num_output_features))
                     batch_predictions_dict[model._name] = batch_predictions
 
@@ -31,8 +31,7 @@ OUT_STEPS = 35
 INPUT_WIDTH = 35
 MIN_PEAK_HEIGHT = 20
 
-combined_df = create_dataframe(workDir, features, 'Time', TRAIN_DATA_SUFFIX)
-combined_df['Time'] = combined_df['Time'] * 24
+combined_df = create_dataframe(workDir, features, 'Time', TRAIN_DATA_SUFFIX, time_scale=24)
 
 filtered_df = combined_df[combined_df['Time'] > NUM_INITIAL_DAYS_TO_DISCARD * 24]
 filtered_df.set_index('Time', inplace=True)
@@ -84,14 +83,10 @@ simple_mlp.compile(loss=tf.keras.losses.CategoricalCrossentropy(),
               metrics=[tf.keras.metrics.CategoricalCrossentropy()])
 history = simple_mlp.fit(x=train_df_inputs_norm, y=train_labels, validation_data=(val_df_inputs_norm, val_labels),
                          epochs=MAX_EPOCHS, callbacks=[early_stopping], shuffle=True)
-simpl_mlp_results = simple_mlp.evaluate(x=test_df_inputs_norm, y=test_labels)
-
-predictions = []
-for input_val in test_df_inputs_norm:
-    inputs = tf.convert_to_tensor(input_val, dtype=tf.float32)
-    inputs = tf.reshape(inputs, (1, 1, imlp))
-    prediction = simple_mlp(inputs)
-    predictions.append(prediction[0])
+# One forward pass over the whole testing set, the test loss is computed from the same predictions
+test_inputs_batch = tf.reshape(tf.convert_to_tensor(test_df_inputs_norm, dtype=tf.float32), (-1, 1, imlp))
+predictions = simple_mlp.predict(test_inputs_batch, batch_size=4096)
+simpl_mlp_results = tf.keras.losses.CategoricalCrossentropy()(test_labels, predictions).numpy()
 
 results = []
 print("Num predictions:", len(predictions))
@@ -13,8 +13,7 @@ NUM_INITIAL_DAYS_TO_DISCARD = 50
 features = ['LH']
 
 
-combined_df = create_dataframe(workDir, features, 'Time', TRAIN_DATA_SUFFIX)
-combined_df['Time'] = combined_df['Time'] * 24
+combined_df = create_dataframe(workDir, features, 'Time', TRAIN_DATA_SUFFIX, time_scale=24)
 
 filtered_df = combined_df[combined_df['Time'] > NUM_INITIAL_DAYS_TO_DISCARD * 24]
 filtered_df.set_index('Time', inplace=True)
@@ -1,7 +1,3 @@
-from collections import Counter
-
-import IPython
-import IPython.display
 import matplotlib.pyplot as plt
 import scipy.signal
 import seaborn as sns
@@ -9,7 +5,8 @@ from tensorflow.keras.callbacks import TensorBoard
 
 from ModelComparator import ModelComparator
 from TimeSeriesVisualizer import TimeSeriesVisualizer
-from models import FeedBack, WideCNN, ClassificationMLP, NoisySinCurve, CNN_LSTM
+from models import FeedBack, WideCNN, ClassificationMLP, NoisySinCurve, CNN_LSTM, convert_to_tensorrt, \
+    set_jit_compile
 from preprocessing_functions import *
 from windowGenerator import WindowGenerator
 
@@ -36,7 +33,75 @@ OUT_STEPS = 35
 NUM_RUNS = 1
 PEAK_COMPARISON_DISTANCE = 2
 PLOT_TESTING = False
+# show the diagnostic plots, otherwise they are saved to plots_dir without opening a window
+SHOW_PLOTS = True
+plots_dir = os.path.join(os.getcwd(), "./plots/")
 SAVE_MODELS = False
+# export the saved models also as TensorRT (FP16) saved models for GPU serving, needs SAVE_MODELS.
+# The comparison below still uses the Keras models
+EXPORT_TENSORRT = False
+# quantize the trained CNN and classifier to INT8 TFLite models (available through their int8_infer)
+QUANTIZE_INT8 = False
+# compile the training steps and the calls of the models with XLA, except for models that do not support it
+JIT_COMPILE = True
+set_jit_compile(JIT_COMPILE)
+# 'mixed_bfloat16' or 'mixed_float16' (tensor core GPUs) runs the layers in half precision, outputs of the models
+# stay in float32. None: 'mixed_bfloat16' only on GPUs with bfloat16 support, 'float32' otherwise
+MIXED_PRECISION_POLICY = None
+
+
+def default_precision_policy():
+    """
+    'mixed_bfloat16' if all the GPUs support bfloat16 (compute capability 8.0 and higher), 'float32' otherwise.
+    """
+    gpus = tf.config.list_physical_devices('GPU')
+    if gpus and all(tf.config.experimental.get_device_details(gpu).get('compute_capability', (0, 0)) >= (8, 0)
+                    for gpu in gpus):
+        return 'mixed_bfloat16'
+    return 'float32'
+
+
+if MIXED_PRECISION_POLICY is None:
+    MIXED_PRECISION_POLICY = default_precision_policy()
+tf.keras.mixed_precision.set_global_policy(MIXED_PRECISION_POLICY)
+if not SHOW_PLOTS:
+    plt.switch_backend('Agg')
+
+
+def show_plot(name):
+    """
+    Shows the current figure or, when SHOW_PLOTS is off, saves it to plots_dir and closes it.
+
+    :param name: name of the file the figure is saved to
+    """
+    if SHOW_PLOTS:
+        plt.show()
+        return
+    os.makedirs(plots_dir, exist_ok=True)
+    plt.savefig(os.path.join(plots_dir, '{}.png'.format(name)))
+    plt.close()
+
+
+def clear_output():
+    """
+    Clears the output of the notebook cell. IPython is imported only when this is called,
+    without IPython installed nothing happens.
+    """
+    try:
+        from IPython.display import clear_output as ipython_clear_output
+    except ImportError:
+        return
+    ipython_clear_output()
+
+
+def new_optimizer():
+    """
+    Adam optimizer, with loss scaling when the gradients are computed in float16.
+    """
+    optimizer = tf.keras.optimizers.Adam()
+    if MIXED_PRECISION_POLICY == 'mixed_float16':
+        optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+    return optimizer
 
 
 def compile_and_fit(model, window, tensor_callback=None, patience=2):
@@ -46,8 +111,9 @@ def compile_and_fit(model, window, tensor_callback=None, patience=2):
     history = None
     for loss in LOSS_FUNCTIONS:
         model.compile(loss=loss,
-                    optimizer=tf.keras.optimizers.Adam(),
-                    metrics=[tf.keras.metrics.MeanAbsoluteError()])
+                    optimizer=new_optimizer(),
+                    metrics=[tf.keras.metrics.MeanAbsoluteError()],
+                    jit_compile=JIT_COMPILE and getattr(model, 'supports_xla', True))
         if tensor_callback is not None:
             callbacks = [early_stopping, tensor_callback]
         else:
@@ -59,11 +125,9 @@ def compile_and_fit(model, window, tensor_callback=None, patience=2):
 
 
 # test on a small TS
-test_dataframe = create_dataframe(inputDir, features, 'Time', TEST_DATA_SUFFIX)
-test_dataframe['Time'] = test_dataframe['Time'] * 24
+test_dataframe = create_dataframe(inputDir, features, 'Time', TEST_DATA_SUFFIX, time_scale=24)
 # train on a long TS
-combined_df = create_dataframe(inputDir, features, 'Time', TRAIN_DATA_SUFFIX)
-combined_df['Time'] = combined_df['Time'] * 24
+combined_df = create_dataframe(inputDir, features, 'Time', TRAIN_DATA_SUFFIX, time_scale=24)
 
 print('Num records in the loaded data for training:', len(combined_df['Time']))
 # Plot the loaded data
@@ -73,7 +137,7 @@ plt.xticks(rotation=45)
 plt.xlabel('Time in hours')
 plt.plot(combined_df['Time'], combined_df[features], )
 plt.title('Loaded combined dataframe for training')
-plt.show()
+show_plot('loaded_combined_df')
 
 
 # First 50 days of the simulation may be a bit messy and thus we ignore them
@@ -93,7 +157,7 @@ print('Num records in the sampled dataframe with raw hours: (Should be the same
 plt.plot(sampled_df_timeH.index, sampled_df_timeH[features], )
 plt.title('Sampled dataframe with raw hours')
 plt.xlabel('Time in hours')
-plt.show()
+show_plot('sampled_df_raw_hours')
 
 sampled_test_df_timeH_index = [i for i in range(NUM_INITIAL_DAYS_TO_DISCARD * 24, int(filtered_test_df.index[-1]) + 1, SAMPLING_FREQUENCY)]
 sampled_test_df = sample_data(filtered_test_df, sampled_test_df_timeH_index, features)
@@ -125,11 +189,13 @@ for feature in features:
     plt.plot(test_df.index, test_df[feature], color='red')
     plt.title('Sampled raw hours split {} levels normalized'.format(feature))
     plt.xlabel('Time in hours')
-    plt.show()
+    show_plot('split_{}_normalized'.format(feature))
 
-tsv_combined = TimeSeriesVisualizer(test_df, features, 35, 35)
-tsv_combined.update_sliders()
-tsv_combined.show()
+if SHOW_PLOTS:
+    # the visualizer is interactive, there is nothing to save
+    tsv_combined = TimeSeriesVisualizer(test_df, features, 35, 35)
+    tsv_combined.update_sliders()
+    tsv_combined.show()
 
 
 """
@@ -146,7 +212,7 @@ def autoregressive_model():
     """
     feedback_model = FeedBack(32, OUT_STEPS, len(features), 20)
     prediction, state = feedback_model.warmup(multi_window.example[0])
-    IPython.display.clear_output()
+    clear_output()
     #log_dir = "logs/fit/"
     #tensorboard_callback = TensorBoard(log_dir=log_dir, histogram_freq=1)
     print(prediction.shape)
@@ -157,16 +223,19 @@ def autoregressive_model():
 
 def multistep_cnn():
     multi_cnn = WideCNN(INPUT_WIDTH, OUT_STEPS, len(features), 20)
-    IPython.display.clear_output()
+    clear_output()
     print('Output shape (batch, time, features): ', multi_cnn(multi_window.example[0]).shape)
     history = compile_and_fit(multi_cnn, multi_window)
+    if QUANTIZE_INT8:
+        representative_inputs = np.concatenate([inputs.numpy() for inputs, _ in multi_window.train.take(4)])
+        multi_cnn.quantize(representative_inputs)
     return multi_cnn
 
 
 def cnn_lstm(filters=None, ks=None, dilations=None):
     cnn_lstm_model = CNN_LSTM(16, INPUT_WIDTH, OUT_STEPS, len(features), 20,
                               filters, ks, dilations)
-    IPython.display.clear_output()
+    clear_output()
     #print('Output shape (batch, time, features): ', cnn_lstm_model(multi_window.example[0]).shape)
     history = compile_and_fit(cnn_lstm_model, multi_window)
     return cnn_lstm_model
@@ -193,23 +262,27 @@ def classification_mlp(train_inputs, train_labels, val_inputs, val_labels, min_p
     early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_loss',
                                                       mode='min')
     classification_model.compile(loss=tf.keras.losses.CategoricalCrossentropy(),
-                                 optimizer=tf.keras.optimizers.Adam(),
-                                 metrics=[tf.keras.metrics.CategoricalCrossentropy()])
+                                 optimizer=new_optimizer(),
+                                 metrics=[tf.keras.metrics.CategoricalCrossentropy()],
+                                 jit_compile=JIT_COMPILE)
     history = classification_model.fit(x=train_inputs, y=train_labels, validation_data=(val_inputs, val_labels),
                              epochs=MAX_EPOCHS, callbacks=[early_stopping], shuffle=True, batch_size=32)
+    if QUANTIZE_INT8:
+        classification_model.quantize(train_inputs.numpy())
     return classification_model
 
 
 peaks, properties = scipy.signal.find_peaks(train_df[features[0]], distance=10, height=0.3)
-distances = [peaks[i+1] - peaks[i] for i in range(len(peaks)-1)]
-count = Counter(distances)
+distances = np.diff(peaks)
 print("Number of cycles:", len(distances))
-numbers = list(count.keys())
-frequencies = list(count.values())
+# histogram of the cycle lengths, only the lengths that occurred
+count = np.bincount(distances)
+numbers = np.flatnonzero(count)
+frequencies = count[numbers]
 plt.bar(numbers, frequencies, color='skyblue')
-plt.show()
+show_plot('cycle_lengths')
 
-period = sum(distances) / len(distances)
+period = np.mean(distances)
 print("Period:", period)
 
 sampled_test_df = test_df
@@ -217,7 +290,8 @@ sampled_test_df = test_df
 ##sampled_test_df.index = (sampled_test_df.index - sampled_test_df.index[0]) / 24
 #tf.config.run_functions_eagerly(True)
 model_comparator = ModelComparator(sampled_test_df, INPUT_WIDTH, OUT_STEPS, features, features[0],
-                                   plot=PLOT_TESTING, peak_comparison_distance=PEAK_COMPARISON_DISTANCE, step=1)
+                                   plot=PLOT_TESTING, peak_comparison_distance=PEAK_COMPARISON_DISTANCE, step=1,
+                                   plot_dir=None if SHOW_PLOTS else plots_dir)
 train_inputs, train_labels, val_inputs, val_labels = classification_datasets([features[0]], features[0])
 for run_id in range(NUM_RUNS):
     feedback_model = autoregressive_model()
@@ -225,7 +299,7 @@ for run_id in range(NUM_RUNS):
     multi_cnn_model = multistep_cnn()
     multi_cnn_model._name = 'CNN'
     fitted_sin = NoisySinCurve(INPUT_WIDTH, OUT_STEPS, 1, train_df, features[0],
-                               noise=0.0, period=period)
+                               noise=0.0, period=period, plot_dir=None if SHOW_PLOTS else plots_dir)
     fitted_sin._name = 'Baseline'
     cnn_lstm_model = cnn_lstm(filters=[256, 128, 64], ks=[4, 3, 2], dilations=[1, 2, 4])
     cnn_lstm_model._name = 'CNN+LSTM'
@@ -245,6 +319,8 @@ for run_id in range(NUM_RUNS):
             model_save_path_full = os.path.join(save_models_dir, model_name)
             saved_models_paths.append(model_save_path_full)
             model.save(model_save_path_full)
+            if EXPORT_TENSORRT:
+                convert_to_tensorrt(model_save_path_full, model_save_path_full + "_TRT")
     list_of_models = models  # []
     """for model_name in saved_models_paths:
         model = tf.keras.models.load_model(model_name,
@@ -258,9 +334,10 @@ for run_id in range(NUM_RUNS):
         sampled_test_df[[column]].to_csv(f"{inputDir}atsv_{column}.csv", index=False, header=False)
     df_index_data = np.array(sampled_test_df.index) - sampled_test_df.index[0]
     np.savetxt("../outputDir/atsv_time.csv", df_index_data, delimiter="\t", fmt='%d')"""
-    tsv = TimeSeriesVisualizer(sampled_test_df, features, INPUT_WIDTH, OUT_STEPS)
-    tsv.update_sliders(list_of_models)
-    tsv.show()
+    if SHOW_PLOTS:
+        tsv = TimeSeriesVisualizer(sampled_test_df, features, INPUT_WIDTH, OUT_STEPS)
+        tsv.update_sliders(list_of_models)
+        tsv.show()
 
 model_comparator.print_peak_statistics()
 model_comparator.plot_in_out_peaks()
@@ -1,21 +1,49 @@
-import random
-
 import numpy as np
 import scipy.signal
 import tensorflow as tf
 from matplotlib import pyplot as plt
+from numba import njit, prange
 from scipy.optimize import curve_fit
 from scipy.signal import savgol_filter
 
-from supporting_scripts import sin_function
+from supporting_scripts import sin_function, find_peaks_in_rows, show_figure
+
+# compile the calls of the models with XLA, read when a model is created. Models with recurrent layers (the cuDNN
+# kernels are not used under XLA) or host ops have supports_xla = False and are never compiled with XLA
+JIT_COMPILE = True
+
+
+def set_jit_compile(jit_compile):
+    """
+    Sets JIT_COMPILE for the models created afterwards.
+    """
+    global JIT_COMPILE
+    JIT_COMPILE = jit_compile
+
+
+def compile_call(function, supports_xla=True):
+    """
+    tf.function of the function, compiled with XLA if JIT_COMPILE is set and supports_xla.
+    """
+    return tf.function(function, jit_compile=JIT_COMPILE and supports_xla)
 
 
 class ResidualWrapper(tf.keras.Model):
     def __init__(self, model):
+        """
+        :param model: model that predicts the change of the inputs. With JIT_COMPILE, the model and the residual add
+        are compiled together with XLA, so the add is fused with the last op of the model, unless the model does not
+        support XLA (supports_xla = False)
+        """
         super().__init__()
         self.model = model
+        self.supports_xla = getattr(model, 'supports_xla', True)
+        self.compiled_residual = compile_call(self.residual, self.supports_xla)
 
     def call(self, inputs, *args, **kwargs):
+        return self.compiled_residual(inputs, *args, **kwargs)
+
+    def residual(self, inputs, *args, **kwargs):
         delta = self.model(inputs, *args, **kwargs)
 
         # The prediction for each time step is the input
@@ -34,19 +62,21 @@ class MMML(tf.keras.Model):
         self.mmml = tf.keras.Sequential([
             tf.keras.layers.Dense(256, activation='relu'),
             tf.keras.layers.Dense(64, activation='relu'),
-            tf.keras.layers.Dense(num_features, activation='relu'),
+            tf.keras.layers.Dense(num_features, activation='relu', dtype='float32'),
         ])
+        # only the dense head is compiled, the two models keep their own compilation
+        self.compiled_combine = compile_call(self.combine)
 
     def call(self, inputs, training=None):
         model1_out = self.model1(inputs, training=training)
         model2_out = self.model2(inputs, training=training)
         if model1_out is None or model2_out is None:
             raise ValueError("One of the model outputs is None.")
-        inputs = model1_out + model2_out
-        inputs = tf.convert_to_tensor(inputs, dtype=tf.float32)
-        result = self.mmml(inputs, training=training)
-        result = tf.convert_to_tensor(result, dtype=tf.float32)
-        return result
+        return self.compiled_combine(model1_out, model2_out, training=training)
+
+    def combine(self, model1_out, model2_out, training=None):
+        # the sum and the output of the float32 last layer are float32 tensors already
+        return self.mmml(model1_out + model2_out, training=training)
 
 
 def custom_activation(x, a=1.0):
@@ -54,6 +84,8 @@ def custom_activation(x, a=1.0):
 
 
 class CNN_LSTM(tf.keras.Model):
+    supports_xla = False
+
     def __init__(self, units, input_length, out_steps, num_features, min_peak_distance=20,
                  filters=None, ks=None, dilations=None):
         super().__init__()
@@ -69,22 +101,42 @@ class CNN_LSTM(tf.keras.Model):
         self.num_features = num_features
         self.num_output_features = num_features
         self.min_peak_distance = min_peak_distance
+        # depthwise-separable convolutions: the dilated depthwise kernel runs per channel, the pointwise kernel
+        # combines the channels
         self.cnl = tf.keras.Sequential([
-            tf.keras.layers.Conv1D(filters=filters[0], kernel_size=ks[0], activation='relu', padding='same',
-                                   dilation_rate=dilations[0],
-                                   input_shape=(input_length, num_features)),
-            tf.keras.layers.Conv1D(filters=filters[1], kernel_size=ks[1], activation='relu', padding='same',
-                                   dilation_rate=dilations[1]),
-            tf.keras.layers.Conv1D(filters=filters[2], kernel_size=ks[2], activation='relu', padding='same',
-                                   dilation_rate=dilations[2]),
+            tf.keras.layers.SeparableConv1D(filters=filters[0], kernel_size=ks[0], activation='relu', padding='same',
+                                            dilation_rate=dilations[0],
+                                            input_shape=(input_length, num_features)),
+            tf.keras.layers.SeparableConv1D(filters=filters[1], kernel_size=ks[1], activation='relu', padding='same',
+                                            dilation_rate=dilations[1]),
+            tf.keras.layers.SeparableConv1D(filters=filters[2], kernel_size=ks[2], activation='relu', padding='same',
+                                            dilation_rate=dilations[2]),
             tf.keras.layers.LSTM(32),
-            tf.keras.layers.Dense(out_steps * num_features),
-            tf.keras.layers.Reshape((out_steps, num_features))
+            tf.keras.layers.Dense(out_steps * num_features, dtype='float32'),
+            tf.keras.layers.Reshape((out_steps, num_features), dtype='float32')
         ])
+        # traced once for every batch size, see predict_cached
+        self._pred_fn = tf.function(lambda x: self(x, training=False), input_signature=[
+            tf.TensorSpec([None, input_length, num_features], tf.float32)])
 
+    @tf.function
     def call(self, inputs):
         return self.cnl(inputs)
 
+    def predict_cached(self, inputs):
+        """
+        Prediction of the model with one graph for inputs of any batch size. Calling the model directly traces
+        the call again for every new input shape.
+
+        :param inputs: tensor of shape (batch_size, input_length, num_features)
+        :return: tensor of shape (batch_size, out_steps, num_features)
+        """
+        inputs = tf.cast(inputs, tf.float32)
+        if not self.built:
+            # the first call builds the model outside of the traced function
+            return self(inputs, training=False)
+        return self._pred_fn(inputs)
+
     def get_peaks(self, prediction, method='raw'):
         """
         For given model predictions identifies peaks in it.
@@ -93,16 +145,53 @@ class CNN_LSTM(tf.keras.Model):
         :param method: NA for this model
         :return: ndarray of indexes where peaks were detected in the input array
         """
-        pred_peaks, _ = scipy.signal.find_peaks(prediction, distance=self.min_peak_distance, height=0.2)
-        position_of_max = np.argmax(prediction)
-        if position_of_max not in pred_peaks:
-            index = np.searchsorted(pred_peaks, position_of_max)
-            pred_peaks = np.insert(pred_peaks, index, position_of_max)
-        return pred_peaks
+        return find_peaks_in_rows(np.asarray(prediction)[np.newaxis], self.min_peak_distance, height=0.2,
+                                  include_max=True)[0]
+
+    def get_peaks_batch(self, predictions, method='raw'):
+        """
+        Identifies peaks in a batch of model predictions, same as get_peaks for every prediction.
+
+        :param predictions: 2D ndarray of predictions (one feature) for every window
+        :param method: NA for this model
+        :return: list of ndarrays of indexes where peaks were detected in the predictions
+        """
+        return find_peaks_in_rows(predictions, self.min_peak_distance, height=0.2, include_max=True)
+
+
+
+class FeedbackCell(tf.keras.layers.AbstractRNNCell):
+    def __init__(self, lstm_cell, dense, **kwargs):
+        """
+        One autoregressive step of the FeedBack model. The cell ignores its inputs, the LSTM cell is fed
+        the previous prediction that is kept as the last state.
+
+        :param lstm_cell: LSTM cell of the FeedBack model
+        :param dense: output dense layer of the FeedBack model
+        """
+        super().__init__(**kwargs)
+        self.lstm_cell = lstm_cell
+        self.dense = dense
+
+    @property
+    def state_size(self):
+        return [self.lstm_cell.units, self.lstm_cell.units, self.dense.units]
 
+    @property
+    def output_size(self):
+        return self.dense.units
+
+    def call(self, inputs, states, training=None):
+        h, c, prediction = states
+        x, (h, c) = self.lstm_cell(prediction, states=[h, c], training=training)
+        # keep the dtype of the prediction state the same in every step
+        prediction = tf.cast(self.dense(x), prediction.dtype)
+        return prediction, [h, c, prediction]
 
 
 class FeedBack(tf.keras.Model):
+    supports_xla = False
+
     def __init__(self, units, out_steps, num_features, min_peak_distance=20):
         """
         A feedback model consisting of one RNN layer with LSTM cell and one dense layer.
@@ -118,32 +207,49 @@ class FeedBack(tf.keras.Model):
         self.num_features = num_features
         self.num_output_features = num_features
         self.min_peak_distance = min_peak_distance
-        self.lstm_cell = tf.keras.layers.LSTMCell(units)
-        self.lstm_rnn = tf.keras.layers.RNN(self.lstm_cell, return_state=True)
-        self.dense = tf.keras.layers.Dense(num_features)
+        # the LSTM layer with the default settings runs the warmup with the fused cuDNN kernel on GPU,
+        # its cell (same weights) makes the autoregressive steps
+        self.lstm_rnn = tf.keras.layers.LSTM(units, activation='tanh', recurrent_activation='sigmoid', use_bias=True,
+                                             unroll=False, return_state=True, dtype='float32')
+        self.lstm_cell = self.lstm_rnn.cell
+        self.dense = tf.keras.layers.Dense(num_features, dtype='float32')
+        # the remaining out_steps - 1 steps run in one RNN layer instead of a Python loop
+        self.feedback_rnn = tf.keras.layers.RNN(FeedbackCell(self.lstm_cell, self.dense), return_sequences=True)
+        # traced once for every batch size and input length, see predict_cached
+        self._pred_fn = tf.function(lambda x: self(x, training=False), input_signature=[
+            tf.TensorSpec([None, None, num_features], tf.float32)])
 
     def warmup(self, inputs):
         x, *state = self.lstm_rnn(inputs)
         prediction = self.dense(x)
         return prediction, state
 
+    # traced once per input shape, the eager callers (comparator, visualizer) then run the whole forecast as one graph
+    @tf.function
     def call(self, inputs, training=None):
-        predictions = []
         prediction, state = self.warmup(inputs)
-        predictions.append(prediction)
-
-        for n in range(1, self.out_steps):
-            x = prediction
-            x, state = self.lstm_cell(x, states=state,
-                                      training=training)
-            prediction = self.dense(x)
-            predictions.append(prediction)
-
-        # predictions.shape => (time, batch, features)
-        predictions = tf.stack(predictions)
         # predictions.shape => (batch, time, features)
-        predictions = tf.transpose(predictions, [1, 0, 2])
-        return predictions
+        predictions = prediction[:, tf.newaxis, :]
+        if self.out_steps == 1:
+            return predictions
+        # the feedback cell does not use its inputs, they only give the number of steps
+        steps = tf.zeros((tf.shape(inputs)[0], self.out_steps - 1, 1), dtype=inputs.dtype)
+        feedback = self.feedback_rnn(steps, initial_state=state + [prediction], training=training)
+        return tf.concat([predictions, tf.cast(feedback, predictions.dtype)], axis=1)
+
+    def predict_cached(self, inputs):
+        """
+        Prediction of the model with one graph for inputs of any batch size. Calling the model directly traces
+        the call again for every new input shape.
+
+        :param inputs: tensor of shape (batch_size, input_length, num_features)
+        :return: tensor of shape (batch_size, out_steps, num_features)
+        """
+        inputs = tf.cast(inputs, tf.float32)
+        if not self.built:
+            # the first call builds the model outside of the traced function
+            return self(inputs, training=False)
+        return self._pred_fn(inputs)
 
     def get_peaks(self, prediction, method='raw'):
         """
@@ -153,12 +259,18 @@ class FeedBack(tf.keras.Model):
         :param method: NA for this model
         :return: ndarray of indexes where peaks were detected in the input array
         """
-        pred_peaks, _ = scipy.signal.find_peaks(prediction, distance=self.min_peak_distance, height=0.2)
-        position_of_max = np.argmax(prediction)
-        if position_of_max not in pred_peaks:
-            index = np.searchsorted(pred_peaks, position_of_max)
-            pred_peaks = np.insert(pred_peaks, index, position_of_max)
-        return pred_peaks
+        return find_peaks_in_rows(np.asarray(prediction)[np.newaxis], self.min_peak_distance, height=0.2,
+                                  include_max=True)[0]
+
+    def get_peaks_batch(self, predictions, method='raw'):
+        """
+        Identifies peaks in a batch of model predictions, same as get_peaks for every prediction.
+
+        :param predictions: 2D ndarray of predictions (one feature) for every window
+        :param method: NA for this model
+        :return: list of ndarrays of indexes where peaks were detected in the predictions
+        """
+        return find_peaks_in_rows(predictions, self.min_peak_distance, height=0.2, include_max=True)
 
     def get_config(self):
         # Return the configuration of the model (needed for saving and loading)
@@ -202,14 +314,50 @@ class WideCNN(tf.keras.Model):
                                    activation='relu',
                                    input_shape=(input_length, num_features),),
             tf.keras.layers.Dense(units=32, activation='relu'),
-            tf.keras.layers.Dense(out_steps * num_features),
-            tf.keras.layers.Reshape((out_steps, num_features))
+            tf.keras.layers.Dense(out_steps * num_features, dtype='float32'),
+            tf.keras.layers.Reshape((out_steps, num_features), dtype='float32')
         ])
         # lambda x: custom_activation(x, a=20.0)
         self.cnn = conv_model_wide
+        self.compiled_call = compile_call(self.cnn)
+        # traced once for every batch size, see predict_cached
+        self._pred_fn = tf.function(lambda x: self(x, training=False), input_signature=[
+            tf.TensorSpec([None, input_length, num_features], tf.float32)])
 
     def call(self, inputs):
-        return self.cnn(inputs)
+        return self.compiled_call(inputs)
+
+    def quantize(self, representative_inputs):
+        """
+        Quantizes the trained model to INT8 for the inference with int8_infer.
+
+        :param representative_inputs: ndarray of shape (num_samples, input_length, num_features), e.g. from training data
+        :return: None
+        """
+        self.int8_interpreter = quantize_int8(self.cnn, representative_inputs)
+
+    def int8_infer(self, inputs):
+        """
+        Prediction of the INT8 quantized model, see quantize.
+
+        :param inputs: ndarray of shape (batch_size, input_length, num_features)
+        :return: ndarray of shape (batch_size, out_steps, num_features)
+        """
+        return tflite_predict(self.int8_interpreter, inputs)
+
+    def predict_cached(self, inputs):
+        """
+        Prediction of the model with one graph for inputs of any batch size. Calling the model directly traces
+        the call again for every new input shape.
+
+        :param inputs: tensor of shape (batch_size, input_length, num_features)
+        :return: tensor of shape (batch_size, out_steps, num_features)
+        """
+        inputs = tf.cast(inputs, tf.float32)
+        if not self.built:
+            # the first call builds the model outside of the traced function
+            return self(inputs, training=False)
+        return self._pred_fn(inputs)
 
     def get_peaks(self, prediction, method='raw'):
         """
@@ -219,12 +367,18 @@ class WideCNN(tf.keras.Model):
         :param method: NA for this model
         :return: ndarray of indexes where peaks were detected in the input array
         """
-        pred_peaks, _ = scipy.signal.find_peaks(prediction, distance=self.min_peak_distance, height=0.2)
-        position_of_max = np.argmax(prediction)
-        if position_of_max not in pred_peaks:
-            index = np.searchsorted(pred_peaks, position_of_max)
-            pred_peaks = np.insert(pred_peaks, index, position_of_max)
-        return pred_peaks
+        return find_peaks_in_rows(np.asarray(prediction)[np.newaxis], self.min_peak_distance, height=0.2,
+                                  include_max=True)[0]
+
+    def get_peaks_batch(self, predictions, method='raw'):
+        """
+        Identifies peaks in a batch of model predictions, same as get_peaks for every prediction.
+
+        :param predictions: 2D ndarray of predictions (one feature) for every window
+        :param method: NA for this model
+        :return: list of ndarrays of indexes where peaks were detected in the predictions
+        """
+        return find_peaks_in_rows(predictions, self.min_peak_distance, height=0.2, include_max=True)
 
     def get_config(self):
         # Return the configuration of the model (needed for saving and loading)
@@ -242,9 +396,43 @@ class WideCNN(tf.keras.Model):
         return cls(**config)
 
 
+@njit(parallel=True, cache=True)
+def refine_sin_shifts(y_batch, x_data, shifts, omega, iterations):
+    """
+    Gauss-Newton least squares fit of the shift b of sin_function with the given period to every row of y_batch,
+    the rows are fitted in parallel.
+    :param y_batch: 2D ndarray with the values of one record per row
+    :param x_data: x values (hours) of the columns of y_batch
+    :param shifts: initial shifts of the records
+    :param omega: angular frequency of the sine function, 2*pi/(period*24)
+    :param iterations: number of Gauss-Newton iterations
+    :return: ndarray of the fitted shifts
+    """
+    result = np.empty(len(shifts))
+    for r in prange(len(shifts)):
+        b = shifts[r]
+        for _ in range(iterations):
+            gradient = 0.0
+            hessian = 0.0
+            for i in range(len(x_data)):
+                phase = (x_data[i] - b) * omega
+                residual = 0.05 * np.sin(phase) + 0.05 - y_batch[r, i]
+                jacobian = -0.05 * omega * np.cos(phase)
+                gradient += jacobian * residual
+                hessian += jacobian * jacobian
+            if hessian > 0:
+                b -= gradient / hessian
+        result[r] = b
+    return result
+
+
+
 class NoisySinCurve(tf.keras.Model):
+    # the optional refinement of the shifts runs on the host
+    supports_xla = False
+
     def __init__(self, input_length, out_steps, num_features, train_df, feature,
-                 noise=0, shift=0, period=28, min_peak_distance=20):
+                 noise=0, shift=0, period=28, min_peak_distance=20, refine_iterations=0, plot_dir=None):
         """
         Sine curve meant as a baseline for LH prediction. The model cannot be trained. When instantiated a train_df
         with one feature must be provided. This feature will be used to set the function period (mean peak distance).
@@ -260,12 +448,16 @@ class NoisySinCurve(tf.keras.Model):
         :param shift: initial shift along the x-axis
         :param period: initial period (in days)
         :param min_peak_distance: minimum distance for peak detection
+        :param refine_iterations: number of Gauss-Newton iterations that refine the closed-form shifts to the least
+        squares fit of the sine function with the fixed amplitude, 0 for no refinement
+        :param plot_dir: if specified, the plot of the fitted curve is saved to this directory instead of being shown
         """
         super().__init__()
         self.input_length = input_length
         self.out_steps = out_steps
         self.num_features = num_features
         self.num_output_features = 1
+        self.refine_iterations = refine_iterations
         self.noise = noise / 10
         self.period = period
         self.shift = shift
@@ -282,37 +474,53 @@ class NoisySinCurve(tf.keras.Model):
         plt.plot(x_fit, y_fit, label='Fitted Curve', color='orange')
         plt.title('Sampled dataframe with raw hours with fitted sin curve')
         plt.xlabel('Time in hours')
-        plt.show()
-
+        show_figure(plt.gcf(), 'fitted_sin_curve', plot_dir)
+        # sin((x-b)*omega) = sin(omega*x)*cos(omega*b) - cos(omega*x)*sin(omega*b), so the shift of the input
+        # can be fitted by linear least squares with the pseudoinverse of the sin/cos design matrix
+        self.omega = 2 * np.pi / (self.period * 24)
+        x_input = np.arange(self.input_length) * 24
+        self.x_input = x_input.astype(np.float64)
+        self.fit_pinv = np.linalg.pinv(np.stack([np.sin(self.omega * x_input), np.cos(self.omega * x_input)],
+                                                axis=1)).astype(np.float32)
+        # hours of the predicted steps
+        self.x_fit = (np.arange(self.input_length, self.input_length + self.out_steps) * 24).astype(np.float32)
+        # stateful generator, the traced call draws new noise on every call
+        self._rng = tf.random.Generator.from_non_deterministic_state()
+
+    @tf.function
     def call(self, inputs):
-        inputs = tf.reshape(inputs, (-1, self.input_length, self.num_features))
-        result = tf.py_function(self.numpy_curve_fit, [inputs], tf.float32)
-        result = tf.reshape(result, (-1, self.out_steps, self.num_output_features))
-        return result
-
-    def numpy_curve_fit(self, inputs):
         """
-        As this model does not work on tensors, a call to non-tensor function is done in call method. This method
-        takes in tensor with batch_size and for every record in the batch fits and subsequently makes prediction
+        For every record in the batch fits the shift of the sine function and subsequently makes prediction
         that can be used for peak detection.
 
         :param inputs: tensor of shape (batch_size, input_length, num_features) First feature is kept, others are discarded
         :return: a tensor of shape (batch_size, out_steps, num_output_features(should be 1))
         """
-        y_batch_data = tf.squeeze(inputs, axis=-1).numpy()
-        x_data = np.arange(self.input_length) * 24
-        output_data = []
-        for y_data in y_batch_data:
-            popt, _ = curve_fit(self.move_curve_function, x_data, y_data, p0=[0])
-            x_fit = np.arange(self.input_length, self.input_length + self.out_steps) * 24
-            y_fit = sin_function(x_fit, popt[0], self.period)
-            noise = np.random.normal(0, self.noise, y_fit.shape)
-            y_fit = y_fit + noise
-            output_data.append(y_fit)
-        stacked_array = np.stack(output_data)
-        expanded_array = np.expand_dims(stacked_array, axis=-1)
-        tensor = tf.convert_to_tensor(expanded_array)
-        return np.array(tensor, dtype=np.float32)
+        inputs = tf.cast(inputs, tf.float32)
+        inputs = tf.reshape(inputs, (-1, self.input_length, self.num_features))
+        y_batch_data = inputs[:, :, 0]
+        # undo the offset and amplitude of the sin_function and fit the shifts of all the records at once
+        coefficients = tf.linalg.matmul((y_batch_data - 0.05) / 0.05, self.fit_pinv, transpose_b=True)
+        shifts = tf.math.atan2(-coefficients[:, 1], coefficients[:, 0]) / self.omega
+        if self.refine_iterations > 0:
+            shifts = tf.numpy_function(self.refine_shifts, [y_batch_data, shifts], tf.float32)
+            shifts.set_shape([None])
+        # sin_function on tensors
+        y_fit = 0.05 * tf.sin((self.x_fit[tf.newaxis, :] - shifts[:, tf.newaxis]) * self.omega) + 0.05
+        y_fit = y_fit + self._rng.normal(tf.shape(y_fit), stddev=self.noise)
+        return tf.reshape(y_fit, (-1, self.out_steps, self.num_output_features))
+
+    def refine_shifts(self, y_batch_data, shifts):
+        """
+        Refines the shifts of the records with refine_sin_shifts, see refine_iterations.
+
+        :param y_batch_data: ndarray of shape (batch_size, input_length)
+        :param shifts: ndarray of initial shifts of the records
+        :return: float32 ndarray of the refined shifts
+        """
+        shifts = refine_sin_shifts(y_batch_data.astype(np.float64), self.x_input, shifts.astype(np.float64),
+                                   self.omega, self.refine_iterations)
+        return shifts.astype(np.float32)
 
     def move_curve_function(self, x_data, b):
         return sin_function(x_data, b, self.period)
@@ -325,8 +533,17 @@ class NoisySinCurve(tf.keras.Model):
         :param method: NA for this model
         :return: ndarray of indexes where peaks were detected in the input array
         """
-        pred_peaks, _ = scipy.signal.find_peaks(prediction, distance=self.min_peak_distance)
-        return pred_peaks
+        return find_peaks_in_rows(np.asarray(prediction)[np.newaxis], self.min_peak_distance)[0]
+
+    def get_peaks_batch(self, predictions, method='raw'):
+        """
+        Identifies peaks in a batch of model predictions, same as get_peaks for every prediction.
+
+        :param predictions: 2D ndarray of predictions (one feature) for every window
+        :param method: NA for this model
+        :return: list of ndarrays of indexes where peaks were detected in the predictions
+        """
+        return find_peaks_in_rows(predictions, self.min_peak_distance)
 
 
     def get_config(self):
@@ -339,7 +556,8 @@ class NoisySinCurve(tf.keras.Model):
             "min_peak_distance": self.min_peak_distance,
             "noise": self.noise,
             "period": self.period,
-            "shift": self.shift
+            "shift": self.shift,
+            "refine_iterations": self.refine_iterations
         })
         return config
 
@@ -366,20 +584,42 @@ class ClassificationMLP(tf.keras.Model):
         self.num_features = num_features
         self.num_output_features = 1
         self.min_peak_distance = min_peak_distance
+        # the dense layers work on flat rows of num_features * input_length values, the output keeps the shape
+        # of the labels (batch_size, 1, out_steps)
         self.mlp = tf.keras.models.Sequential([
-            tf.keras.layers.Reshape((1, num_features * input_length)),
             tf.keras.layers.Dense(units=256, activation='relu'),
             tf.keras.layers.Dense(units=64, activation='relu'),
-            tf.keras.layers.Dense(units=out_steps, activation='sigmoid'),
+            tf.keras.layers.Dense(units=out_steps, activation='sigmoid', dtype='float32'),
+            tf.keras.layers.Reshape((1, out_steps), dtype='float32'),
         ])
+        self.compiled_call = compile_call(self.forward)
 
     def call(self, inputs):
-        inputs = tf.reshape(inputs, (-1, self.num_features, self.input_length))
-        shape = inputs.shape
-        print(shape)
-        result = self.mlp(inputs)
-        print(result.shape)
-        return result
+        return self.compiled_call(inputs)
+
+    def forward(self, inputs):
+        inputs = tf.reshape(inputs, (-1, self.num_features * self.input_length))
+        return self.mlp(inputs)
+
+    def quantize(self, representative_inputs):
+        """
+        Quantizes the trained model to INT8 for the inference with int8_infer.
+
+        :param representative_inputs: ndarray of shape (num_samples, num_features, input_length), e.g. the training inputs
+        :return: None
+        """
+        representative_inputs = np.reshape(representative_inputs, (-1, self.num_features * self.input_length))
+        self.int8_interpreter = quantize_int8(self.mlp, representative_inputs)
+
+    def int8_infer(self, inputs):
+        """
+        Prediction of the INT8 quantized model, see quantize.
+
+        :param inputs: ndarray of inputs of the model
+        :return: ndarray of shape (batch_size, 1, out_steps)
+        """
+        inputs = np.reshape(inputs, (-1, self.num_features * self.input_length))
+        return tflite_predict(self.int8_interpreter, inputs)
 
     def get_peaks(self, prediction, method='raw'):
         """
@@ -400,14 +640,21 @@ class ClassificationMLP(tf.keras.Model):
         elif method == 'combined':
             return self.peaks_combined(prediction, self.min_peak_distance)
 
+    def get_peaks_batch(self, predictions, method='raw'):
+        """
+        Identifies peaks in a batch of model predictions, same as get_peaks for every prediction.
+
+        :param predictions: 2D ndarray of predictions (one feature) for every window
+        :param method: see get_peaks. Only the 'raw' method searches all the predictions at once.
+        :return: list of ndarrays of indexes where peaks were detected in the predictions
+        """
+        if method == 'raw':
+            return find_peaks_in_rows(predictions, self.min_peak_distance, include_max=True)
+        return [self.get_peaks(prediction, method) for prediction in predictions]
+
     def peaks_raw(self, prediction, min_peak_distance):
-        pred_peaks, _ = scipy.signal.find_peaks(prediction, distance=min_peak_distance)
-        position_of_max = np.argmax(prediction)
-        # The following code sometimes results in 2 peaks too close to each other, but that is somehow acceptable
-        if position_of_max not in pred_peaks:
-            index = np.searchsorted(pred_peaks, position_of_max)
-            pred_peaks = np.insert(pred_peaks, index, position_of_max)
-        return pred_peaks
+        # The added maximum sometimes results in 2 peaks too close to each other, but that is somehow acceptable
+        return find_peaks_in_rows(np.asarray(prediction)[np.newaxis], min_peak_distance, include_max=True)[0]
 
     def peaks_smoothened(self, prediction, min_peak_distance):
         result = tf.reshape(prediction, (self.out_steps))
@@ -433,13 +680,14 @@ class ClassificationMLP(tf.keras.Model):
             potential_second_peak = prediction[first_peak+offset:]
             sorted_indexes = np.argsort(potential_second_peak)[::-1]
             sorted_indexes += first_peak + offset
-            peak_index = None
-            for index in sorted_indexes:
-                if self.is_peak(index, prediction):
-                    peak_index = index
-                    break
-            if peak_index is not None:
-                result = np.append(result, peak_index)
+            # is_peak of all the values at once, the highest candidate that is a peak is the second peak
+            is_peak_mask = np.empty(len(prediction), dtype=bool)
+            is_peak_mask[0] = prediction[0] > prediction[1]
+            is_peak_mask[-1] = prediction[-1] > prediction[-2]
+            is_peak_mask[1:-1] = (prediction[1:-1] > prediction[:-2]) & (prediction[1:-1] > prediction[2:])
+            candidates = sorted_indexes[is_peak_mask[sorted_indexes]]
+            if len(candidates) > 0:
+                result = np.append(result, candidates[0])
         return result
 
     def get_config(self):
@@ -471,15 +719,117 @@ class Distributed_peaks(tf.keras.Model):
             Put one peak based on the position. Try to put another peak roughly 10 (11) days later.
             put som small values as a noise in between
         """
-        result = np.array([random.random()/10 for _ in range(self.position-2)])
-        result = np.append(result, 0.2)
-        result = np.append(result, 0.5)
-        result = np.append(result, 0.2)
-        result = np.append(result, np.array([random.random()/10 for _ in range(self.out_steps-self.position-1)]))
-        result = tf.reshape(result, (1, self.out_steps, self.num_features))
+        result = np.random.rand(self.out_steps).astype(np.float32) / 10
+        result[self.position-2:self.position+1] = [0.2, 0.5, 0.2]
+        result = tf.reshape(tf.constant(result), (1, self.out_steps, self.num_features))
         return result
 
 
+def serving_input_shape(saved_model_dir, batch_size):
+    """
+    Input shape of the serving signature of a saved model, the unknown dimensions are set to batch_size.
+
+    :param saved_model_dir: directory of the model saved by model.save
+    :param batch_size: size of the unknown (batch) dimensions
+    :return: tuple with the input shape
+    """
+    signature = tf.saved_model.load(saved_model_dir).signatures['serving_default']
+    input_spec = tf.nest.flatten(signature.structured_input_signature)[0]
+    return tuple(batch_size if dim is None else dim for dim in input_spec.shape.as_list())
+
+
+def convert_to_tensorrt(saved_model_dir, output_dir, precision='FP16', batch_size=32):
+    """
+    Converts a saved model to a TensorRT optimized saved model for inference on NVIDIA GPUs. Requires TensorFlow built
+    with TensorRT. The engines are built for the input shape of the serving signature of the model with
+    batch_size as the batch dimension. Export only, the converted model is meant to be loaded with
+    tf.saved_model.load for serving, the comparison in main.py uses the Keras models.
+
+    :param saved_model_dir: directory of the model saved by model.save
+    :param output_dir: directory where the converted model is saved
+    :param precision: precision of the TensorRT engines, 'FP32' or 'FP16'
+    :param batch_size: batch size the engines are built for
+    :return: None
+    """
+    from tensorflow.python.compiler.tensorrt import trt_convert as trt
+
+    input_shape = serving_input_shape(saved_model_dir, batch_size)
+    converter = trt.TrtGraphConverterV2(input_saved_model_dir=saved_model_dir, precision_mode=precision,
+                                        max_workspace_size_bytes=1 << 30)
+    converter.convert()
+
+    def input_fn():
+        yield (tf.zeros(input_shape, dtype=tf.float32),)
+
+    converter.build(input_fn=input_fn)
+    converter.save(output_dir)
+
+
+def float32_copy(model, sample_inputs):
+    """
+    Copy of a Keras Sequential layer stack with all the layers in float32 (regardless of the global mixed precision
+    policy) and the same weights.
+
+    :param model: Keras Sequential model to copy
+    :param sample_inputs: inputs of the model, the copy is built for their shape
+    :return: the float32 copy of the model
+    """
+    def clone_layer(layer):
+        config = layer.get_config()
+        config['dtype'] = 'float32'
+        return layer.__class__.from_config(config)
+
+    # explicit float32 input, the input of the original stack can be in the compute dtype of the outer model
+    float_model = tf.keras.Sequential([tf.keras.Input(shape=sample_inputs.shape[1:], dtype=tf.float32)] +
+                                      [clone_layer(layer) for layer in model.layers])
+    float_model.set_weights(model.get_weights())
+    return float_model
+
+
+def quantize_int8(model, representative_inputs, num_samples=100):
+    """
+    Post-training INT8 quantization of a Keras model with TFLite. The weights and activations are quantized to int8,
+    inputs and outputs stay float32. The model is converted as a float32 copy, so the mixed precision casts
+    of its layers do not end up in the quantized model.
+
+    :param model: Keras model to quantize (layer stack of a trained model)
+    :param representative_inputs: ndarray of inputs of the model used to calibrate the activation ranges
+    :param num_samples: number of the representative inputs used for the calibration
+    :return: TFLite interpreter of the quantized model
+    """
+    representative_inputs = np.asarray(representative_inputs, dtype=np.float32)
+
+    def representative_dataset():
+        for sample in representative_inputs[:num_samples]:
+            yield [sample[np.newaxis]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(float32_copy(model, representative_inputs[:1]))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    interpreter = tf.lite.Interpreter(model_content=converter.convert())
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def tflite_predict(interpreter, inputs):
+    """
+    Runs the TFLite interpreter on a batch of inputs.
+
+    :param interpreter: TFLite interpreter, e.g. from quantize_int8
+    :param inputs: ndarray of inputs of the model
+    :return: ndarray of outputs of the model
+    """
+    inputs = np.asarray(inputs, dtype=np.float32)
+    input_details = interpreter.get_input_details()[0]
+    if tuple(input_details['shape']) != inputs.shape:
+        interpreter.resize_tensor_input(input_details['index'], inputs.shape)
+        interpreter.allocate_tensors()
+    interpreter.set_tensor(input_details['index'], inputs)
+    interpreter.invoke()
+    return interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+
+
 """
     Single step models
     input length = _
@@ -5,7 +5,7 @@ import pandas as pd
 import tensorflow as tf
 
 
-def create_dataframe(input_files_directory, features, time_file_prefix, feature_file_suffix='1'):
+def create_dataframe(input_files_directory, features, time_file_prefix, feature_file_suffix='1', time_scale=1):
     """
     Creates a pandas dataframe from csv files containing time series data.
     The function assumes existence of the directory where the files are stored.
@@ -21,14 +21,18 @@ def create_dataframe(input_files_directory, features, time_file_prefix, feature_
     :param features: list of strings where each string in a prefix of the corresponding feature file
     :param time_file_prefix: prefix of the file containing the timestamps of the time series.
     :param feature_file_suffix:
+    :param time_scale: the timestamps are multiplied by this value when read (i.e. 24 to convert days to hours)
     :return: dataframe with timestamp and the features' tracks
     """
     time_file = os.path.join(input_files_directory, "{}_{}.csv".format(time_file_prefix, feature_file_suffix))
-    times = pd.read_csv(time_file, header=None, names=[time_file_prefix])
+    # Time stays in float64, the solver's time steps may be too close to each other for float32
+    times = pd.read_csv(time_file, header=None, names=[time_file_prefix], dtype=np.float64, engine='c')
+    if time_scale != 1:
+        times[time_file_prefix] *= time_scale
     hormone_levels = [times]
     for feature in features:
         feature_file = os.path.join(input_files_directory, "{}_{}.csv".format(feature, feature_file_suffix))
-        feature_values = pd.read_csv(feature_file, header=None, names=[feature])
+        feature_values = pd.read_csv(feature_file, header=None, names=[feature], dtype=np.float32, engine='c')
         hormone_levels.append(feature_values)
     combined_df = pd.concat(hormone_levels, axis=1)
     return combined_df
@@ -44,37 +48,16 @@ def sample_data(original_df, new_index, features):
     :return: new df with sampled values at the time points from the new index. The new index is set as an index
     """
     """
-        for every time in the new index, find the largest smaller value and smallest larger value
-        and interpolate them to get the new value
-        Edge case if at least one of the is the same time
+        Merge the new time points into the original index, let pandas interpolate the missing values
+        based on the index values and keep only the rows of the new index.
+        Edge case: time points outside the original index get the value of the nearest original sample.
     """
-    hormone_levels = {key: [] for key in features}
-    i = 0
-    for curr_time in new_index:
-        while original_df.index[i + 1] < curr_time:
-            i += 1
-        for feature in features:
-            # index_of_largest_smaller_time = i
-            x0 = original_df.index[i]
-            y0 = original_df[feature][original_df.index[i]]
-            x1 = original_df.index[i + 1]
-            y1 = original_df[feature][original_df.index[i + 1]]
-            x = curr_time
-            if type(curr_time) == np.datetime64:
-                diff_x1_x = (x1 - x).total_seconds()
-                diff_x_x0 = (x - x0).total_seconds()
-                diff_x1_x0 = (x1 - x0).total_seconds()
-            else:
-                diff_x1_x = (x1 - x)
-                diff_x_x0 = (x - x0)
-                diff_x1_x0 = (x1 - x0)
-            y = y0 * (diff_x1_x / diff_x1_x0) + y1 * (diff_x_x0 / diff_x1_x0)
-            hormone_levels[feature].append(y)
-
-    sampled_df = pd.DataFrame()
-    for feature in features:
-        sampled_df[feature] = np.array(hormone_levels[feature])
-    sampled_df.index = new_index
+    new_index = pd.Index(new_index)
+    method = 'time' if isinstance(new_index, pd.DatetimeIndex) else 'index'
+    sampled_df = (original_df[features]
+                  .reindex(original_df.index.union(new_index))
+                  .interpolate(method=method, limit_direction='both')
+                  .reindex(new_index))
     sampled_df.index.name = 'DateTime'
     return sampled_df
 
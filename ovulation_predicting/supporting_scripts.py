@@ -1,6 +1,9 @@
+import os
+
 import matplotlib.colors as mcolors
 import numpy as np
 from matplotlib import pyplot as plt
+from numba import njit
 from scipy.optimize import curve_fit
 
 
@@ -34,6 +37,22 @@ def fit_sin_curve(train_df, feature, val_df, test_df, original_df):
     plt.show()
 
 
+def show_figure(fig, name, plot_dir=None):
+    """
+    Shows the figure, or saves it to the plot_dir and closes it if the plot_dir is specified.
+    :param fig: figure to show
+    :param name: name of the file the figure is saved to
+    :param plot_dir: directory where the figure is saved, None to show the figure
+    :return: None
+    """
+    if plot_dir is None:
+        plt.show()
+        return
+    os.makedirs(plot_dir, exist_ok=True)
+    fig.savefig(os.path.join(plot_dir, '{}.png'.format(name)))
+    plt.close(fig)
+
+
 def fit_curve(x, y, fun, a=1, b=1, c=1):
     popt, _ = curve_fit(fun, x, y, p0=[a, b, c])
     a_opt, b_opt, c_opt = popt
@@ -53,6 +72,83 @@ def darken_color(color, factor=0.7):
     return darkened_color
 
 
+@njit(cache=True)
+def _find_peaks_in_rows(predictions, distance, height, include_max, peaks, num_peaks):
+    """
+    Kernel of find_peaks_in_rows, writes the peaks of row r to peaks[r, :num_peaks[r]].
+    """
+    num_rows, row_length = predictions.shape
+    for r in range(num_rows):
+        row = predictions[r]
+        # local maxima as in scipy.signal.find_peaks, the middle (rounded down) of a flat maximum is the peak
+        n = 0
+        i = 1
+        while i < row_length - 1:
+            if row[i - 1] < row[i]:
+                i_ahead = i + 1
+                while i_ahead < row_length - 1 and row[i_ahead] == row[i]:
+                    i_ahead += 1
+                if row[i_ahead] < row[i]:
+                    if row[i] >= height:
+                        peaks[r, n] = (i + i_ahead - 1) // 2
+                        n += 1
+                    i = i_ahead
+            i += 1
+        # from the highest peak on, the lower peaks closer than distance are removed. Stable order, of equally
+        # high peaks the earlier one is kept
+        keep = np.ones(n, dtype=np.bool_)
+        order = np.argsort(-row[peaks[r, :n]], kind='mergesort')
+        for k in range(n):
+            j = order[k]
+            if not keep[j]:
+                continue
+            m = j - 1
+            while m >= 0 and peaks[r, j] - peaks[r, m] < distance:
+                keep[m] = False
+                m -= 1
+            m = j + 1
+            while m < n and peaks[r, m] - peaks[r, j] < distance:
+                keep[m] = False
+                m += 1
+        kept = 0
+        for j in range(n):
+            if keep[j]:
+                peaks[r, kept] = peaks[r, j]
+                kept += 1
+        if include_max:
+            position_of_max = np.argmax(row)
+            index = 0
+            while index < kept and peaks[r, index] < position_of_max:
+                index += 1
+            if index == kept or peaks[r, index] != position_of_max:
+                for j in range(kept, index, -1):
+                    peaks[r, j] = peaks[r, j - 1]
+                peaks[r, index] = position_of_max
+                kept += 1
+        num_peaks[r] = kept
+
+
+def find_peaks_in_rows(predictions, distance, height=None, include_max=False):
+    """
+    Finds peaks in every row of predictions with a compiled kernel. The peaks are the same as of
+    scipy.signal.find_peaks with the distance and height arguments called on every row, except for equally high peaks
+    closer than distance. Of these the earlier one is kept, scipy's choice depends on its sorting algorithm.
+    :param predictions: 2D ndarray with one prediction (one feature) per row
+    :param distance: minimum distance between the peaks
+    :param height: minimum height of the peaks
+    :param include_max: if true, position of the maximum of every row is added to its peaks
+    :return: list of ndarrays of indexes where peaks were detected in the rows
+    """
+    predictions = np.ascontiguousarray(predictions, dtype=np.float64)
+    num_rows, row_length = predictions.shape
+    # a row has at most every other value a peak, plus the maximum
+    peaks = np.empty((num_rows, row_length // 2 + 2), dtype=np.int64)
+    num_peaks = np.empty(num_rows, dtype=np.int64)
+    _find_peaks_in_rows(predictions, int(np.ceil(distance)), -np.inf if height is None else float(height),
+                        include_max, peaks, num_peaks)
+    return [peaks[r, :num_peaks[r]] for r in range(num_rows)]
+
+
 def get_signed_distances(gt_peaks, pred_peaks):
     """
     For each peak in pred_peaks finds distance to the closest peak in gt_peaks. Positive if the closest gt peak is before
@@ -63,12 +159,49 @@ def get_signed_distances(gt_peaks, pred_peaks):
     """
     if len(gt_peaks) == 0:
         return np.array([])
-    signed_distances = []
-    for p in pred_peaks:
-        distances = p - gt_peaks
-        closest_gt = distances[np.argmin(np.abs(distances))]
-        signed_distances.append(closest_gt)
-    return np.array(signed_distances)
+    gt_peaks = np.sort(gt_peaks)
+    pred_peaks = np.asarray(pred_peaks)
+    # the closest gt peak is one of the two gt peaks around the position where the predicted peak would be inserted
+    idx = np.searchsorted(gt_peaks, pred_peaks)
+    left = gt_peaks[np.maximum(idx - 1, 0)]
+    right = gt_peaks[np.minimum(idx, len(gt_peaks) - 1)]
+    # on a tie the earlier gt peak is taken
+    closest_gt = np.where(pred_peaks - left <= right - pred_peaks, left, right)
+    return pred_peaks - closest_gt
+
+
+@njit(cache=True)
+def accumulate_distances(signed_distances, hist, max_distance, threshold):
+    """
+    Adds the signed distances to the histogram of distances. Distance d is counted in hist[d + max_distance].
+    :param signed_distances: int64 array of signed distances between peaks
+    :param hist: int64 array of length 2 * max_distance + 1, updated in place
+    :param max_distance: maximum absolute value of the distances
+    :param threshold: threshold for the peak comparison distance
+    :return: number of distances within the threshold and sum of the absolute values of the distances
+    """
+    num_within = 0
+    sum_of_dists = 0
+    for d in signed_distances:
+        hist[d + max_distance] += 1
+        abs_d = abs(d)
+        sum_of_dists += abs_d
+        if abs_d <= threshold:
+            num_within += 1
+    return num_within, sum_of_dists
+
+
+@njit(cache=True)
+def accumulate_window_distances(signed_distances, signed_distances_rev, hist, hist_rev, max_distance, threshold):
+    """
+    Adds the distances of predicted peaks to gt peaks and of gt peaks to predicted peaks of one window
+    to their histograms, see accumulate_distances.
+    :return: number of distances within the threshold, sum of the absolute values of the distances and
+    number of reversed distances within the threshold
+    """
+    num_within, sum_of_dists = accumulate_distances(signed_distances, hist, max_distance, threshold)
+    num_within_rev, _ = accumulate_distances(signed_distances_rev, hist_rev, max_distance, threshold)
+    return num_within, sum_of_dists, num_within_rev
 
 
 def print_peak_statistics(peaks_within_threshold, peaks_outside_threshold, sum_of_dists_to_nearest_peak,
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of ovulation_predicting are imported by their names, as in main.py
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
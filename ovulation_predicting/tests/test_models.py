@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from models import ClassificationMLP, NoisySinCurve, WideCNN
+from supporting_scripts import sin_function
+
+
+def test_get_peaks_matches_get_peaks_batch():
+    rng = np.random.default_rng(0)
+    predictions = np.round(rng.random((100, 35)), 1).astype(np.float32)
+    model = WideCNN(35, 35, 1, min_peak_distance=20)
+    batch_peaks = model.get_peaks_batch(predictions)
+    for prediction, peaks in zip(predictions, batch_peaks):
+        np.testing.assert_array_equal(model.get_peaks(prediction), peaks)
+
+
+def grid_search_shifts(y_batch, x_data, period, num_shifts=20000):
+    """Least squares shift of sin_function for every row, searched on a grid over one period."""
+    shifts = np.linspace(0, period * 24, num_shifts, endpoint=False)
+    curves = sin_function(x_data[np.newaxis, :], shifts[:, np.newaxis], period)
+    errors = ((y_batch[:, np.newaxis, :] - curves[np.newaxis]) ** 2).sum(axis=2)
+    return shifts[np.argmin(errors, axis=1)]
+
+
+def test_refined_shifts_match_grid_search(tmp_path):
+    rng = np.random.default_rng(0)
+    input_length, period = 35, 28
+    x_data = np.arange(input_length) * 24.0
+    true_shifts = rng.uniform(0, period * 24, 20)
+    y_batch = sin_function(x_data[np.newaxis, :], true_shifts[:, np.newaxis], period)
+    y_batch = y_batch + rng.normal(0, 0.01, y_batch.shape)
+    train_df = pd.DataFrame({'LH': sin_function(np.arange(200) * 24.0, 0, period)}, index=np.arange(200) * 24.0)
+    model = NoisySinCurve(input_length, 35, 1, train_df, 'LH', period=period, refine_iterations=5,
+                          plot_dir=str(tmp_path))
+
+    # closed-form shifts of call as the initial guess
+    coefficients = ((y_batch - 0.05) / 0.05) @ model.fit_pinv.T.astype(np.float64)
+    initial_shifts = np.arctan2(-coefficients[:, 1], coefficients[:, 0]) / model.omega
+    refined = model.refine_shifts(y_batch.astype(np.float32), initial_shifts.astype(np.float32))
+    expected = grid_search_shifts(y_batch, x_data, period)
+    # compare on the circle, shifts a period apart are the same curve
+    difference = (refined - expected + period * 12) % (period * 24) - period * 12
+    np.testing.assert_allclose(difference, 0, atol=0.5)
+
+    # call runs the same refinement on its inputs
+    predictions = model(y_batch[:, :, np.newaxis].astype(np.float32)).numpy()[:, :, 0]
+    x_pred = np.arange(input_length, input_length + 35) * 24.0
+    np.testing.assert_allclose(predictions, sin_function(x_pred[np.newaxis, :], expected[:, np.newaxis], period),
+                               atol=1e-3)
+
+
+def test_quantize_int8_under_mixed_bfloat16():
+    tf.keras.mixed_precision.set_global_policy('mixed_bfloat16')
+    try:
+        rng = np.random.default_rng(0)
+        inputs = rng.random((64, 1, 35)).astype(np.float32)
+        model = ClassificationMLP(35, 35, 1, 20)
+        predictions = model(inputs).numpy()
+        model.quantize(inputs)
+        int8_predictions = model.int8_infer(inputs[:8])
+    finally:
+        tf.keras.mixed_precision.set_global_policy('float32')
+    assert int8_predictions.dtype == np.float32
+    assert any(detail['dtype'] == np.int8 for detail in model.int8_interpreter.get_tensor_details())
+    np.testing.assert_allclose(int8_predictions, predictions[:8], atol=0.05)
@@ -0,0 +1,36 @@
+import numpy as np
+import scipy.signal
+
+from supporting_scripts import find_peaks_in_rows
+
+
+def test_find_peaks_in_rows_matches_scipy_without_ties():
+    rng = np.random.default_rng(0)
+    predictions = rng.random((50, 35))
+    for distance, height in [(1, None), (5, 0.2), (20, 0.2), (7.5, None)]:
+        row_peaks = find_peaks_in_rows(predictions, distance, height=height)
+        for row, peaks in zip(predictions, row_peaks):
+            expected, _ = scipy.signal.find_peaks(row, distance=distance, height=height)
+            np.testing.assert_array_equal(peaks, expected)
+
+
+def test_find_peaks_in_rows_include_max():
+    row = np.array([0.0, 0.3, 0.0, 0.0, 0.9])
+    peaks = find_peaks_in_rows(row[np.newaxis], 1, include_max=True)[0]
+    np.testing.assert_array_equal(peaks, [1, 4])
+
+
+def test_find_peaks_in_rows_ties_keep_earlier_peak():
+    row = np.array([0.0, 0.5, 0.0, 0.1, 0.0, 0.5, 0.0, 0.0])
+    peaks = find_peaks_in_rows(row[np.newaxis], 20, height=0.2)[0]
+    np.testing.assert_array_equal(peaks, [1])
+
+
+def test_find_peaks_in_rows_does_not_depend_on_batch():
+    rng = np.random.default_rng(1)
+    # rounded values give many equally high peaks
+    predictions = np.round(rng.random((200, 35)), 1)
+    row_peaks = find_peaks_in_rows(predictions, 20, height=0.2, include_max=True)
+    for row, peaks in zip(predictions, row_peaks):
+        single = find_peaks_in_rows(row[np.newaxis], 20, height=0.2, include_max=True)[0]
+        np.testing.assert_array_equal(peaks, single)
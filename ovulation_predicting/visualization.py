@@ -18,8 +18,7 @@ OUTPUT_LENGTH = 35
 hormone = 'LH'
 
 
-combined_df = create_dataframe(workDir, features, 'Time', TRAIN_DATA_SUFFIX)
-combined_df['Time'] = combined_df['Time'] * 24
+combined_df = create_dataframe(workDir, features, 'Time', TRAIN_DATA_SUFFIX, time_scale=24)
 filtered_df = combined_df[combined_df['Time'] > NUM_INITIAL_DAYS_TO_DISCARD * 24]
 filtered_df.set_index('Time', inplace=True)
 sampled_df_timeH_index = [i for i in range(NUM_INITIAL_DAYS_TO_DISCARD * 24, int(filtered_df.index[-1]) + 1, SAMPLING_FREQUENCY)]
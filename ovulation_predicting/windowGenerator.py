@@ -94,28 +94,35 @@ class WindowGenerator():
 
 
     def make_dataset(self, data):
-        data = np.array(data, dtype=np.float32)
-        ds = tf.keras.utils.timeseries_dataset_from_array(
-            data=data,
-            targets=None,
-            sequence_length=self.total_window_size,
-            sequence_stride=1,
-            shuffle=True,
-            batch_size=32, )
-        ds = ds.map(self.split_window)
+        data = tf.constant(np.asarray(data, dtype=np.float32))
+        # All the windows at once, (num_windows, total_window_size, num_features)
+        windows = tf.signal.frame(data, frame_length=self.total_window_size, frame_step=1, axis=0)
+        inputs, labels = self.split_window(windows)
+        ds = tf.data.Dataset.from_tensor_slices((inputs, labels))
+        # The windows are already in memory, only their order changes between the epochs.
+        # A split shorter than one window gives no windows and an empty dataset, the buffer size must be positive
+        ds = ds.cache().shuffle(max(int(windows.shape[0]), 1)).batch(32).prefetch(tf.data.AUTOTUNE)
         return ds
 
+    def get_dataset(self, name, data):
+        """Get and cache the dataset `name` made from `data`, so that it is built only once."""
+        result = getattr(self, name, None)
+        if result is None:
+            result = self.make_dataset(data)
+            setattr(self, name, result)
+        return result
+
     @property
     def train(self):
-        return self.make_dataset(self.train_df)
+        return self.get_dataset('_train', self.train_df)
 
     @property
     def val(self):
-        return self.make_dataset(self.val_df)
+        return self.get_dataset('_val', self.val_df)
 
     @property
     def test(self):
-        return self.make_dataset(self.test_df)
+        return self.get_dataset('_test', self.test_df)
 
     @property
     def example(self):